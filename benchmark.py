@@ -0,0 +1,582 @@
+# -*- coding: utf-8 -*-
+# Benchmark de punta a punta sin red: levanta servidores locales que imitan
+# las cámaras, aviationweather.gov, RAMMB y la API de Telegram, y ejecuta
+# BotController.run() contra ellos usando Chromium local en lugar de browserless.
+# Con --startup mide en cambio el arranque en frío (importación e inicialización)
+# en procesos nuevos, como una invocación de cron o de contenedor.
+#
+#   python benchmark.py --runs 5 --latency 0.08 --jitter 0.04
+#   python benchmark.py --startup 10 --only metar
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import re
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from run_metrics import percentile
+
+CAMERA_IMAGE_IDS = ("liveImage", "camara", "webcam")
+HEAVY_MODULES = ("playwright", "telegram", "httpx", "PIL")
+STARTUP_STAGE_SETS = ("metar", "metar,static", "metar,static,interactive,satellite")
+
+# Se ejecuta en un proceso nuevo por medición; la última línea es el resultado
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+controller = main.BotController(sys.argv[1].split(","))
+built = time.perf_counter()
+
+async def cycle():
+    controller._start_resources()
+    await controller._stop_resources()
+
+asyncio.run(cycle())
+ready = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "init": built - imported,
+    "resources": ready - built,
+    "modules": [m for m in sys.argv[2].split(",") if m in sys.modules],
+}))
+"""
+
+
+def solid_gif(width, height, colors, delay=10, padding=0, checker=0):
+    # GIF mínimo de color sólido por frame, sin dependencias. El LZW emite un
+    # "clear" cada dos literales para que el tamaño de código se quede en 3 bits.
+    # Con checker > 0 alterna cuadros de ese tamaño con el color siguiente, para
+    # que la imagen no parezca "en blanco" al post-procesado.
+    palette = bytes([0, 0, 0, 200, 60, 40, 40, 160, 220, 240, 240, 240])
+    data = bytearray(b"GIF89a")
+    data += struct.pack("<HHBBB", width, height, 0xF1, 0, 0) + palette
+    data += b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00"
+    if padding:
+        filler = bytes(padding)
+        data += b"\x21\xfe"
+        for i in range(0, len(filler), 255):
+            block = filler[i : i + 255]
+            data += bytes([len(block)]) + block
+        data += b"\x00"
+
+    pixels = width * height
+    for color in colors:
+        codes = []
+        for i in range(pixels):
+            if i % 2 == 0:
+                codes.append(4)
+            cell = 0
+            if checker:
+                cell = (i % width // checker + i // width // checker) % 2
+            codes.append((color + cell) % 4)
+        codes.append(5)
+        packed, buffer, bits = bytearray(), 0, 0
+        for code in codes:
+            buffer |= code << bits
+            bits += 3
+            while bits >= 8:
+                packed.append(buffer & 0xFF)
+                buffer >>= 8
+                bits -= 8
+        if bits:
+            packed.append(buffer & 0xFF)
+
+        data += b"\x21\xf9\x04\x04" + struct.pack("<H", delay) + b"\x00\x00"
+        data += b"\x2c" + struct.pack("<HHHHB", 0, 0, width, height, 0) + b"\x02"
+        for i in range(0, len(packed), 255):
+            block = packed[i : i + 255]
+            data += bytes([len(block)]) + block
+        data += b"\x00"
+    data += b"\x3b"
+    return bytes(data)
+
+
+class FakeServices:
+    def __init__(self, latency, jitter, image_kb, frame_interval, map_ids):
+        self.latency = latency
+        self.jitter = jitter
+        self.image_kb = image_kb
+        self.frame_interval = frame_interval
+        self.map_ids = map_ids
+        self.requests = 0
+        self.bytes_served = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def local_url(self, url):
+        # https://host/ruta?q -> http://127.0.0.1:puerto/host/ruta?q
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ""
+        return f"http://127.0.0.1:{self.port}/{parts.netloc}{parts.path}{query}"
+
+    def next_message_id(self):
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def epoch(self):
+        return int(time.time() // self.frame_interval)
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length)
+                with services._lock:
+                    services.bytes_received += length
+                self._dispatch()
+
+            def _dispatch(self):
+                delay = services.latency + random.uniform(
+                    -services.jitter, services.jitter
+                )
+                time.sleep(max(0.0, delay))
+                parts = urlsplit(self.path)
+                host, _, path = parts.path.lstrip("/").partition("/")
+                query = parse_qs(parts.query)
+                with services._lock:
+                    services.requests += 1
+                try:
+                    services.route(self, host, "/" + path, query)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def respond(self, status, body=b"", content_type="text/html", headers=()):
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with services._lock:
+                    services.bytes_served += len(body)
+
+        return Handler
+
+    # --- Rutas ---
+    def route(self, handler, host, path, query):
+        if host == "api.telegram.org":
+            return self.telegram(handler, path)
+        if host == "aviationweather.gov":
+            return self.metar(handler, path, query)
+        if host == "rammb.cira.colostate.edu":
+            return self.rammb(handler, path, query)
+        if host == "www.skylinewebcams.com":
+            return handler.respond(200, SKYLINE_PAGE)
+        if path.endswith((".jpg", ".gif", ".png")):
+            return self.camera_image(handler, host, path)
+        images = "".join(
+            f'<img id="{image_id}" src="/{host}/cam{path.rstrip("/")}/{image_id}.jpg">'
+            for image_id in CAMERA_IMAGE_IDS
+        )
+        filler = "<p>" + "contenido " * 2000 + "</p>"
+        return handler.respond(200, f"<html><body>{filler}{images}</body></html>")
+
+    def camera_image(self, handler, host, path):
+        epoch = self.epoch()
+        etag = f'"{abs(hash((host, path, epoch)))}"'
+        if handler.headers.get("If-None-Match") == etag:
+            return handler.respond(304, headers=[("ETag", etag)])
+        body = solid_gif(64, 48, [epoch % 4], padding=self.image_kb * 1024, checker=8)
+        return handler.respond(200, body, "image/gif", [("ETag", etag)])
+
+    def metar(self, handler, path, query):
+        # Una observación nueva por estación en cada intervalo de frames
+        ids = query.get("ids", [""])[0].split(",")
+        observed_at = self.epoch() * self.frame_interval
+        stamp = time.strftime("%d%H%MZ", time.gmtime(observed_at))
+        if path.endswith("/taf"):
+            data = [
+                {"icaoId": icao, "rawTAF": f"TAF {icao} {stamp} 09010KT 9999 SCT030"}
+                for icao in ids
+                if icao
+            ]
+        else:
+            data = [
+                {
+                    "icaoId": icao,
+                    "obsTime": int(observed_at),
+                    "rawOb": f"{icao} {stamp} 09012KT 9999 FEW030 25/18 Q1013",
+                }
+                for icao in ids
+                if icao
+            ]
+        handler.respond(200, json.dumps(data), "application/json")
+
+    def rammb(self, handler, path, query):
+        if path.endswith("loop.asp"):
+            map_id = query.get("data_folder", [""])[0]
+            count = int(query.get("number_of_images_to_display", ["12"])[0])
+            name = map_id.rsplit("/", 1)[-1]
+            epoch = self.epoch()
+            frames = "".join(
+                f'<img src="images/{map_id}/{name}_'
+                f'{time.strftime("%Y%m%d%H%M%S", time.gmtime((epoch - i) * self.frame_interval))}.gif">'
+                for i in range(count)
+            )
+            return handler.respond(200, f"<html><body>{frames}</body></html>")
+        if "/images/" in path:
+            return handler.respond(
+                200, solid_gif(200, 120, [self.epoch() % 4]), "image/gif"
+            )
+        if path.endswith("loopgif"):
+            gif = solid_gif(200, 120, [i % 4 for i in range(12)])
+            return handler.respond(200, gif, "image/gif")
+        links = "".join(
+            f'<a href="?data_folder={map_id}" onclick="show(event)">{map_id}</a> '
+            for map_id in self.map_ids
+        )
+        return handler.respond(200, RAMMB_PAGE.replace("{links}", links))
+
+    def telegram(self, handler, path):
+        method = path.rsplit("/", 1)[-1]
+        chat = {"id": 1, "type": "private"}
+
+        def message(**extra):
+            message_id = self.next_message_id()
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": chat,
+                **extra,
+            }
+
+        def photo():
+            file_id = f"p{self.next_message_id()}"
+            return [
+                {"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}
+            ]
+
+        def video():
+            file_id = f"v{self.next_message_id()}"
+            return {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "width": 2,
+                "height": 2,
+                "duration": 1,
+            }
+
+        if method == "getMe":
+            result = {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "bench",
+                "username": "bench_bot",
+            }
+        elif method == "sendMediaGroup":
+            # Un mensaje por foto del grupo, ya sea subida o reenviada por file_id
+            count = len(re.findall(rb'"type": ?"photo"', handler.body)) or 1
+            result = [message(photo=photo()) for _ in range(count)]
+        elif method == "sendVideo":
+            result = message(video=video())
+        elif method == "sendPhoto":
+            result = message(photo=photo())
+        else:
+            result = message(text="ok")
+        handler.respond(
+            200, json.dumps({"ok": True, "result": result}), "application/json"
+        )
+
+
+SKYLINE_PAGE = """<html><body>
+<div class="play-wrapper" onclick="play()" style="width:200px;height:50px">play</div>
+<video id="v" width="640" height="360"></video>
+<button data-fullscreen onclick="document.documentElement.requestFullscreen().catch(() => {})">fs</button>
+<script>
+function play() {
+  const v = document.getElementById("v");
+  setTimeout(() => {
+    for (const [key, value] of [["paused", false], ["readyState", 4], ["currentTime", 1], ["videoWidth", 640]]) {
+      Object.defineProperty(v, key, { get: () => value });
+    }
+    v.dispatchEvent(new Event("playing"));
+  }, 1500);
+}
+</script></body></html>"""
+
+RAMMB_PAGE = """<html><body>{links}
+<button id="downloadLoop" style="display:none" onclick="build()">loop</button>
+<div id="animatedGifWrapper"></div>
+<script>
+function show(e) {
+  e.preventDefault();
+  setTimeout(() => { document.getElementById("downloadLoop").style.display = "block"; }, 300);
+}
+function build() {
+  fetch("loopgif").then((r) => r.blob()).then((blob) => {
+    const reader = new FileReader();
+    reader.onload = () => {
+      const img = new Image();
+      img.src = reader.result;
+      document.getElementById("animatedGifWrapper").appendChild(img);
+    };
+    reader.readAsDataURL(blob);
+  });
+}
+</script></body></html>"""
+
+
+def configure_controller(controller, services, stations=0):
+    if stations:
+        # Estaciones sintéticas para medir el costo con listas grandes
+        controller.metar_stations = [
+            {"icao": f"X{i:03d}", "name": f"Estación {i}"} for i in range(stations)
+        ]
+        controller.metar_icaos = [s["icao"] for s in controller.metar_stations]
+    for camera in controller.cam_config:
+        for key in ("page_url", "base_url"):
+            if key in camera:
+                camera[key] = services.local_url(camera[key])
+    maps = controller.satellite_maps
+    maps["start_url"] = services.local_url(maps["start_url"])
+    maps["frames_url"] = services.local_url(maps["frames_url"])
+
+
+def stage_key(span):
+    return f"{span['name']}:{span['type']}" if "type" in span else span["name"]
+
+
+def summarize(wall_times, reports):
+    stages = {}
+    for report in reports:
+        for span in report["spans"]:
+            stages.setdefault(stage_key(span), []).append(span["duration"])
+    usage_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "runs": len(wall_times),
+        "wall_time": {
+            "min": round(min(wall_times), 3),
+            "p50": round(percentile(wall_times, 0.5), 3),
+            "p95": round(percentile(wall_times, 0.95), 3),
+            "max": round(max(wall_times), 3),
+        },
+        "stages": {
+            key: {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 4),
+                "p95": round(percentile(values, 0.95), 4),
+                "p99": round(percentile(values, 0.99), 4),
+                "max": round(max(values), 4),
+            }
+            for key, values in sorted(stages.items())
+        },
+        # ru_maxrss está en KiB en Linux
+        "peak_rss_mb": {
+            "self": round(usage_self / 1024, 1),
+            "children": round(usage_children / 1024, 1),
+        },
+    }
+
+
+def print_summary(summary, services):
+    wall = summary["wall_time"]
+    print(f"\nEjecuciones: {summary['runs']}")
+    print(
+        f"Tiempo total   min {wall['min']:.2f}s  p50 {wall['p50']:.2f}s  "
+        f"p95 {wall['p95']:.2f}s  max {wall['max']:.2f}s"
+    )
+    print(f"{'Etapa':32} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for key, stats in summary["stages"].items():
+        print(
+            f"{key:32} {stats['count']:>5} {stats['p50']:>9.3f} {stats['p95']:>9.3f} "
+            f"{stats['p99']:>9.3f} {stats['max']:>9.3f}"
+        )
+    rss = summary["peak_rss_mb"]
+    print(f"RSS pico: proceso {rss['self']} MB, hijos {rss['children']} MB")
+    print(
+        f"Servidor falso: {services.requests} peticiones, "
+        f"{services.bytes_served / 1024:.0f} KiB servidos, "
+        f"{services.bytes_received / 1024:.0f} KiB recibidos"
+    )
+
+
+def measure_startup(runs, stage_sets):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for stages in stage_sets:
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE, stages, ",".join(HEAVY_MODULES)],
+                cwd=repo,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            sample = json.loads(completed.stdout.strip().splitlines()[-1])
+            sample["process"] = time.perf_counter() - started
+            samples.append(sample)
+        results[stages] = {
+            key: {
+                "p50": round(percentile([s[key] for s in samples], 0.5), 4),
+                "max": round(max(s[key] for s in samples), 4),
+            }
+            for key in ("process", "import", "init", "resources")
+        }
+        results[stages]["modules"] = samples[-1]["modules"]
+    return results
+
+
+def print_startup(results, runs):
+    print(f"\nArranque en frío ({runs} procesos por conjunto de etapas, p50/max en s)")
+    print(f"{'Etapas':36} {'proceso':>15} {'import':>15} {'init':>15} {'recursos':>15}")
+    for stages, stats in results.items():
+        cells = " ".join(
+            f"{stats[key]['p50']:>7.3f}/{stats[key]['max']:<7.3f}"
+            for key in ("process", "import", "init", "resources")
+        )
+        print(f"{stages:36} {cells}")
+        print(f"{'':36} módulos pesados: {', '.join(stats['modules']) or 'ninguno'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline del bot.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos")
+    parser.add_argument("--jitter", type=float, default=0.02, help="segundos")
+    parser.add_argument("--image-kb", type=int, default=150)
+    parser.add_argument(
+        "--frame-interval",
+        type=float,
+        default=600,
+        help="segundos entre cambios de imagen/frames en las fuentes falsas",
+    )
+    parser.add_argument(
+        "--cold", action="store_true", help="borrar la caché antes de cada ejecución"
+    )
+    parser.add_argument(
+        "--stations",
+        type=int,
+        default=0,
+        help="estaciones METAR sintéticas (0 = las del registro)",
+    )
+    parser.add_argument(
+        "--chats", type=int, default=1, help="destinos de Telegram (CHAT_IDS)"
+    )
+    parser.add_argument(
+        "--only", help="etapas a ejecutar (como en main.py --only), p. ej. metar,static"
+    )
+    parser.add_argument(
+        "--startup",
+        type=int,
+        metavar="N",
+        help="medir el arranque en frío con N procesos por conjunto de etapas",
+    )
+    parser.add_argument("--output", help="guardar el resumen en JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    os.environ.update(
+        TELEGRAM_TOKEN="123:bench",
+        CHAT_IDS=",".join(str(chat) for chat in range(1, args.chats + 1)),
+        CACHE_DIR=os.path.join(workdir, "cache"),
+        METRICS_DIR=os.path.join(workdir, "metrics"),
+    )
+    os.environ.pop("BROWSERLESS_TOKEN", None)
+    stages = args.only.split(",") if args.only else None
+
+    if args.startup:
+        results = measure_startup(
+            args.startup, [args.only] if args.only else STARTUP_STAGE_SETS
+        )
+        print_startup(results, args.startup)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(workdir, ignore_errors=True)
+        return
+
+    import main as bot_main
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    probe = bot_main.BotController()
+    map_ids = [mapa["id"] for mapa in probe.satellite_maps["maps"]]
+    services = FakeServices(
+        args.latency, args.jitter, args.image_kb, args.frame_interval, map_ids
+    ).start()
+    os.environ["TELEGRAM_API_URL"] = (
+        f"http://127.0.0.1:{services.port}/api.telegram.org/bot"
+    )
+    os.environ["METAR_API_URL"] = services.local_url(
+        "https://aviationweather.gov/api/data/metar"
+    )
+    os.environ["TAF_API_URL"] = services.local_url(
+        "https://aviationweather.gov/api/data/taf"
+    )
+
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    wall_times = []
+    try:
+        for run in range(args.runs):
+            if args.cold:
+                shutil.rmtree(os.environ["CACHE_DIR"], ignore_errors=True)
+            controller = bot_main.BotController(stages)
+            configure_controller(controller, services, args.stations)
+            started = time.perf_counter()
+            asyncio.run(controller.run())
+            wall_times.append(time.perf_counter() - started)
+            print(f"Ejecución {run + 1}/{args.runs}: {wall_times[-1]:.2f}s")
+    finally:
+        os.chdir(previous_cwd)
+        services.stop()
+
+    reports = []
+    for path in sorted(glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    summary = summarize(wall_times, reports)
+    print_summary(summary, services)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
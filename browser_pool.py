@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import run_metrics
+
+
+class BrowserPool:
+    # Un único navegador por proceso, compartido por todas las capturas.
+    # Si hay URL CDP se conecta a browserless; si no, lanza Chromium local.
+    def __init__(self, cdp_url=None, max_pages=4, connect_timeout=120000):
+        self.cdp_url = cdp_url
+        self.max_pages = max_pages
+        self.connect_timeout = connect_timeout
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._browser is not None:
+                logging.warning("Conexión con el navegador perdida. Reconectando...")
+                await self._close_browser()
+
+            if self._playwright is None:
+                # Playwright se importa recién cuando una captura lo necesita
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+
+            mode = "remote" if self.cdp_url else "local"
+            with run_metrics.span("cdp_connect", mode=mode):
+                if self.cdp_url:
+                    logging.info("🌐 Conectando al navegador remoto (CDP)...")
+                    self._browser = await self._playwright.chromium.connect_over_cdp(
+                        self.cdp_url, timeout=self.connect_timeout
+                    )
+                else:
+                    logging.info("🌐 Iniciando Chromium local (headless)...")
+                    self._browser = await self._playwright.chromium.launch(
+                        headless=True,
+                        args=["--no-sandbox", "--disable-dev-shm-usage"],
+                    )
+            return self._browser
+
+    async def _new_context(self, context_options):
+        # Si el socket CDP se cayó entre usos, se reconecta y se reintenta una vez.
+        for attempt in range(2):
+            browser = await self._get_browser()
+            try:
+                return await browser.new_context(**context_options)
+            except Exception as e:
+                if attempt or browser.is_connected():
+                    raise
+                run_metrics.add_retry()
+                logging.warning(f"No se pudo abrir un contexto ({e}). Reintentando...")
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        async with self._semaphore:
+            context = await self._new_context(context_options)
+            try:
+                page = await context.new_page()
+                yield page
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    # El navegador pudo haberse desconectado; no hay nada que cerrar.
+                    pass
+
+    async def _close_browser(self):
+        browser, self._browser = self._browser, None
+        if browser is None:
+            return
+        try:
+            await browser.close()
+        except Exception as e:
+            logging.warning(f"Error al cerrar el navegador: {e}")
+
+    async def close(self):
+        async with self._lock:
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+from json_store import load_json, save_json
+
+
+class FrameCache:
+    # Caché persistente por cámara: ETag/Last-Modified, hash del contenido (y
+    # perceptual) y una copia del último frame enviado. Se limpia por
+    # antigüedad y por LRU al guardar.
+    def __init__(self, folder, max_entries=200, max_age=7 * 24 * 3600):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.index_path = os.path.join(folder, "index.json")
+        os.makedirs(folder, exist_ok=True)
+        self.entries = load_json(self.index_path, "Caché de frames")
+
+    def _touch(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry["last_access"] = time.time()
+        return entry
+
+    def conditional_headers(self, key):
+        entry = self._touch(key) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def frame_path(self, key):
+        entry = self._touch(key)
+        if entry and entry.get("frame") and os.path.exists(entry["frame"]):
+            return entry["frame"]
+        return None
+
+    def resolved_url(self, key, ttl):
+        entry = self._touch(key) or {}
+        if entry.get("image_url") and time.time() - entry.get("resolved_at", 0) < ttl:
+            return entry["image_url"]
+        return None
+
+    def set_resolved_url(self, key, url):
+        now = time.time()
+        entry = self.entries.setdefault(key, {})
+        entry.update(image_url=url, resolved_at=now, last_access=now)
+
+    def perceptual_hash(self, key):
+        return (self.entries.get(key) or {}).get("dhash")
+
+    def set_perceptual_hash(self, key, value):
+        # Hash del último frame enviado (no del último capturado): así un
+        # cambio gradual termina superando el umbral de "congelado".
+        self.entries.setdefault(key, {})["dhash"] = value
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def is_new(self, key, digest):
+        # Compara con el último frame entregado; no modifica la caché
+        return (self._touch(key) or {}).get("sha256") != digest
+
+    def commit(self, key, path, digest, etag=None, last_modified=None):
+        # Se llama cuando el frame ya llegó a Telegram: recién entonces su hash
+        # y sus validadores pasan a ser la referencia. Si el envío falla, la
+        # próxima ejecución lo vuelve a descargar y a enviar.
+        entry = self.entries.setdefault(key, {})
+        changed = entry.get("sha256") != digest
+        now = time.time()
+        entry.update(
+            sha256=digest,
+            etag=etag,
+            last_modified=last_modified,
+            last_access=now,
+        )
+        if changed or not entry.get("frame") or not os.path.exists(entry["frame"]):
+            frame = os.path.join(self.folder, os.path.basename(path))
+            shutil.copyfile(path, frame)
+            entry["frame"] = frame
+        if changed:
+            entry["updated_at"] = now
+
+    def _evict(self):
+        now = time.time()
+        expired = [
+            key
+            for key, entry in self.entries.items()
+            if now - entry.get("last_access", 0) > self.max_age
+        ]
+        by_access = sorted(
+            (key for key in self.entries if key not in expired),
+            key=lambda key: self.entries[key].get("last_access", 0),
+        )
+        overflow = by_access[: max(0, len(by_access) - self.max_entries)]
+        for key in expired + overflow:
+            entry = self.entries.pop(key)
+            frame = entry.get("frame")
+            if frame and os.path.exists(frame):
+                os.remove(frame)
+        if expired or overflow:
+            logging.info(
+                f"Caché de frames: {len(expired) + len(overflow)} entradas eliminadas."
+            )
+
+    def save(self):
+        self._evict()
+        save_json(self.index_path, self.entries)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from html.parser import HTMLParser
+
+
+class ImgTagFinder(HTMLParser):
+    # Parser incremental: se alimenta por fragmentos y deja de buscar en cuanto
+    # aparece <img id=...>, sin construir el DOM completo de la página.
+    def __init__(self, image_id):
+        super().__init__(convert_charrefs=True)
+        self.image_id = image_id
+        self.src = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.src is not None or tag != "img":
+            return
+        attrs = dict(attrs)
+        if attrs.get("id") == self.image_id and attrs.get("src"):
+            self.src = attrs["src"]
+
+    handle_startendtag = handle_starttag
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+
+class HttpPool:
+    # Cliente HTTP asíncrono compartido: conexiones keep-alive reutilizables,
+    # HTTP/2 cuando el servidor lo ofrece y un límite de conexiones por host.
+    def __init__(self, max_connections=20, max_per_host=4, timeout=20, http2=True):
+        self.max_per_host = max_per_host
+        self._host_semaphores = {}
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    def _semaphore(self, url):
+        host = httpx.URL(url).host
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_semaphores[host]
+
+    async def get(self, url, **kwargs):
+        async with self._semaphore(url):
+            return await self._client.get(url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        async with self._semaphore(url):
+            async with self._client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+
+# Pillow es opcional: sin él la etapa de post-procesado queda desactivada y las
+# imágenes se envían tal como se capturaron.
+try:
+    from PIL import Image, ImageChops, ImageStat
+except ImportError:
+    Image = None
+
+SAVE_OPTIONS = {
+    "jpeg": {"format": "JPEG", "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "method": 4},
+}
+OUTPUT_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+def available():
+    return Image is not None
+
+
+def _crop_uniform_border(image, tolerance=12):
+    # Recorta barras uniformes (letterbox del video a pantalla completa, fondo
+    # de la página alrededor de la imagen) tomando como fondo el píxel (0, 0).
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L")
+    bbox = diff.point(lambda value: 255 if value > tolerance else 0).getbbox()
+    if bbox and bbox != (0, 0, *image.size):
+        return image.crop(bbox)
+    return image
+
+
+def difference_hash(image, size=8):
+    # dHash de 64 bits: robusto a recompresión y reescalado, sirve para detectar
+    # cámaras congeladas que reenvían el mismo cuadro con otros bytes.
+    pixels = list(
+        image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata()
+    )
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:016x}"
+
+
+def hash_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def process_image(
+    path,
+    output_folder,
+    max_dimension,
+    image_format,
+    quality,
+    blank_stddev,
+    crop_border=False,
+):
+    # Se ejecuta en un proceso del pool: solo recibe y devuelve datos simples.
+    with Image.open(path) as source:
+        source.load()
+        image = source.convert("RGB")
+    # Sin metadatos de origen (comentarios, EXIF): Telegram los descarta y un
+    # comentario grande ni siquiera cabe en un segmento JPEG
+    image.info = {}
+    original_size = image.size
+    original_bytes = os.path.getsize(path)
+
+    stddev = max(ImageStat.Stat(image.convert("L")).stddev)
+    if stddev < blank_stddev:
+        return {"status": "blank", "stddev": round(stddev, 2)}
+
+    # Solo en capturas de pantalla: en los bytes originales de una cámara un
+    # borde uniforme es contenido (cielo nocturno, niebla), no letterbox
+    if crop_border:
+        image = _crop_uniform_border(image)
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    # Nombre propio: la captura original queda intacta para la caché de frames
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output_path = os.path.join(
+        output_folder, f"{stem}_sent{OUTPUT_EXTENSIONS[image_format]}"
+    )
+    tmp_path = f"{output_path}.tmp"
+    image.save(tmp_path, quality=quality, **SAVE_OPTIONS[image_format])
+    output_bytes = os.path.getsize(tmp_path)
+
+    result = {
+        "status": "ok",
+        "dhash": difference_hash(image),
+        "bytes_in": original_bytes,
+        "size": image.size,
+    }
+    if image.size == original_size and output_bytes >= original_bytes:
+        # Sin recorte ni reescalado y sin ahorro: se conserva el original
+        os.remove(tmp_path)
+        result.update(path=path, bytes_out=original_bytes)
+    else:
+        os.replace(tmp_path, output_path)
+        result.update(path=output_path, bytes_out=output_bytes)
+    return result
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+
+
+def load_json(path, what):
+    # Estado persistido entre ejecuciones; si falta o está corrupto se empieza
+    # de cero en lugar de abortar la ejecución.
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"{what} ilegible, se reinicia: {e}")
+        return {}
+
+
+def save_json(path, data):
+    # Escritura atómica: un corte a mitad de camino deja el archivo anterior
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
@@ -1,199 +1,414 @@
 # -*- coding: utf-8 -*-
+import argparse
 import asyncio
 import datetime
 import os
+import random
+import signal
 import sys
 import time
-import shutil
 import base64
 import subprocess
 import logging
-from urllib.parse import urljoin
+import multiprocessing
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from urllib.parse import urljoin, urlsplit
 
-import requests
-import telegram
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from browser_pool import BrowserPool
+from frame_cache import FrameCache
+from html_extract import ImgTagFinder
+from metar import ObservationStore, decode_metar, format_station
+import run_metrics
+from run_metrics import RunMetrics
+from satellite_frames import SatelliteFrameStore
+from source_health import SourceHealth
+from source_scheduler import SourceScheduler
+from sources import load_sources
+
+# Hay un frame de video decodificado y la reproducción está avanzando
+VIDEO_FRAME_READY_JS = """() => Array.from(document.querySelectorAll("video")).some(
+    (v) => !v.paused && v.readyState >= 2 && v.currentTime > 0 && v.videoWidth > 0
+)"""
+
+# Recursos que las páginas de OVSICORI no necesitan para mostrar la imagen
+BLOCKED_RESOURCE_TYPES = {
+    "font",
+    "stylesheet",
+    "media",
+    "texttrack",
+    "websocket",
+    "eventsource",
+    "manifest",
+}
+BLOCKED_URL_KEYWORDS = (
+    "googletagmanager",
+    "google-analytics",
+    "googlesyndication",
+    "doubleclick",
+    "facebook",
+    "addthis",
+)
+# Etapas seleccionables con --only y los tipos de cámara que abarca cada una
+STAGES = ("metar", "static", "interactive", "satellite")
+STAGE_CAMERA_TYPES = {
+    "static": ("image",),
+    "interactive": ("interactive_simple", "interactive"),
+}
+# Latencia esperada (s) por tipo de cámara mientras no haya historial propio
+EXPECTED_CAMERA_LATENCY = {"image": 2, "interactive_simple": 15, "interactive": 45}
+CAMERA_BACKENDS = {
+    "image": "http",
+    "interactive_simple": "browser",
+    "interactive": "browser",
+}
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+# Firmas de los formatos de IMAGE_EXTENSIONS, para respuestas sin Content-Type
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36"
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     stream=sys.stdout,
 )
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 class BotController:
-    def __init__(self):
+    def __init__(self, stages=None):
+        self.stages = set(stages or STAGES)
         self.telegram_token = os.environ.get("TELEGRAM_TOKEN")
-        self.chat_id = os.environ.get("CHAT_ID")
+        # CHAT_IDS admite varios destinos separados por coma; CHAT_ID sigue valiendo
+        self.chat_ids = [
+            chat_id.strip()
+            for chat_id in os.environ.get(
+                "CHAT_IDS", os.environ.get("CHAT_ID", "")
+            ).split(",")
+            if chat_id.strip()
+        ]
         self.browserless_token = os.environ.get("BROWSERLESS_TOKEN")
+        # Endpoints externos configurables (p. ej. para el benchmark sin red)
+        self.telegram_api_url = os.environ.get(
+            "TELEGRAM_API_URL", "https://api.telegram.org/bot"
+        )
+        self.metar_api_url = os.environ.get(
+            "METAR_API_URL", "https://aviationweather.gov/api/data/metar"
+        )
+        self.taf_api_url = os.environ.get(
+            "TAF_API_URL", "https://aviationweather.gov/api/data/taf"
+        )
 
         # --- CAMBIO: Usar conexión HTTP (CDP) que es más robusta en entornos de nube ---
+        # Sin BROWSERLESS_TOKEN se usa el Chromium local instalado en la imagen.
         self.browserless_url = (
             f"https://chrome.browserless.io?token={self.browserless_token}"
+            if self.browserless_token
+            else None
         )
 
-        self.INTERACTIVE_CAM_TIMEOUT = 240  # 4 minutos de timeout
+        # Límites fijos por cámara; con historial suficiente se usa el p95 de
+        # cada fuente por HEALTH_TIMEOUT_MARGIN (sin bajar de HEALTH_TIMEOUT_MIN)
+        self.INTERACTIVE_CAM_TIMEOUT = float(
+            os.environ.get("INTERACTIVE_CAM_TIMEOUT", 240)
+        )
+        self.STATIC_CAM_TIMEOUT = float(os.environ.get("STATIC_CAM_TIMEOUT", 45))
+        self.HEALTH_TIMEOUT_MARGIN = float(os.environ.get("HEALTH_TIMEOUT_MARGIN", 2))
+        self.HEALTH_TIMEOUT_MIN = float(os.environ.get("HEALTH_TIMEOUT_MIN", 10))
+        # Fallos seguidos que abren el circuito y backoff inicial (se duplica)
+        self.CIRCUIT_FAILURE_THRESHOLD = int(
+            os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 3)
+        )
+        self.CIRCUIT_BACKOFF = int(os.environ.get("CIRCUIT_BACKOFF", 900))
+        self.source_health = None
+        # Límites (segundos) de las esperas por eventos que reemplazan los sleeps fijos
+        self.IMAGE_READY_TIMEOUT = float(os.environ.get("IMAGE_READY_TIMEOUT", 10))
+        self.VIDEO_READY_TIMEOUT = float(os.environ.get("VIDEO_READY_TIMEOUT", 30))
+        self.FULLSCREEN_READY_TIMEOUT = float(
+            os.environ.get("FULLSCREEN_READY_TIMEOUT", 3)
+        )
+        self.SATELLITE_READY_TIMEOUT = float(
+            os.environ.get("SATELLITE_READY_TIMEOUT", 5)
+        )
+        # Máximo de contextos/páginas abiertos a la vez en el navegador compartido
+        self.BROWSER_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", 4))
+        self.bot = None
+        self.delivery = None
+        # Cola de envío: tasa máxima (mensajes/s), ráfaga y agrupación de fotos
+        self.TELEGRAM_RATE = float(os.environ.get("TELEGRAM_RATE", 1.0))
+        self.TELEGRAM_BURST = int(os.environ.get("TELEGRAM_BURST", 3))
+        # Límite global del bot sumando todos los chats (Telegram: ~30 msg/s)
+        self.TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 30))
+        self.MEDIA_FLUSH_SECONDS = float(os.environ.get("MEDIA_FLUSH_SECONDS", 5))
+        self.browser_pool = None
+        # Límite de conexiones simultáneas por host (varias cámaras comparten OVSICORI)
+        self.HTTP_MAX_PER_HOST = int(os.environ.get("HTTP_MAX_PER_HOST", 4))
+        self.http_pool = None
 
-        if not all([self.telegram_token, self.chat_id, self.browserless_token]):
+        if not all([self.telegram_token, self.chat_ids]):
             logging.error(
-                "FATAL: Faltan variables de entorno (TELEGRAM_TOKEN, CHAT_ID, BROWSERLESS_TOKEN)."
+                "FATAL: Faltan variables de entorno (TELEGRAM_TOKEN, CHAT_IDS/CHAT_ID)."
             )
             sys.exit("Configuración incompleta. Saliendo.")
+        if not self.browserless_token:
+            logging.warning(
+                "BROWSERLESS_TOKEN no definido: se usará Chromium local (headless)."
+            )
 
-        self.cam_config = self._get_camera_config()
-        self.metar_icaos = ["MROC", "MRPV", "MRLB"]
-        self.satellite_maps = self._get_satellite_maps_config()
+        # "incremental": descarga solo frames nuevos y arma el MP4 localmente;
+        # "browser": GIF completo desde RAMMB (también es el respaldo)
+        self.SATELLITE_MODE = os.environ.get("SATELLITE_MODE", "incremental")
+        # Registro de fuentes (cámaras, estaciones METAR y mapas satelitales)
+        self.SOURCES_FILE = os.environ.get(
+            "SOURCES_FILE",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json"),
+        )
+        try:
+            sources = load_sources(
+                self.SOURCES_FILE,
+                incremental_satellite=self.SATELLITE_MODE == "incremental",
+            )
+        except (OSError, ValueError) as e:
+            logging.error(f"FATAL: No se pudo cargar el registro de fuentes: {e}")
+            sys.exit("Configuración de fuentes inválida. Saliendo.")
+        self.cam_config = sources["cameras"]
+        self.metar_stations = sources["metar"]["stations"]
+        self.metar_icaos = [station["icao"] for station in self.metar_stations]
+        self.satellite_maps = sources["satellite"]
+        # Estaciones por llamada a la API, antigüedad mínima del último METAR
+        # antes de volver a pedirlo y si se incluyen los TAF
+        self.METAR_BATCH_SIZE = int(os.environ.get("METAR_BATCH_SIZE", 25))
+        self.METAR_REFRESH = int(os.environ.get("METAR_REFRESH", 20 * 60))
+        self.TAF_ENABLED = os.environ.get("TAF_ENABLED", "on") == "on"
+        self.observations = None
+        # Fuentes en curso a la vez por backend y por host de origen
+        self.HTTP_MAX_SOURCES = int(os.environ.get("HTTP_MAX_SOURCES", 16))
+        self.SOURCE_MAX_PER_HOST = int(os.environ.get("SOURCE_MAX_PER_HOST", 4))
+        self.scheduler = None
+        # Mapas capturados a la vez (cada uno en su página) y conversiones ffmpeg
+        self.SATELLITE_CAPTURE_CONCURRENCY = int(
+            os.environ.get("SATELLITE_CAPTURE_CONCURRENCY", 2)
+        )
+        self.SATELLITE_CONVERSION_WORKERS = int(
+            os.environ.get("SATELLITE_CONVERSION_WORKERS", 2)
+        )
+        # "stream": GIF por tramos a ffmpeg vía stdin; "file": temp.gif + ffmpeg
+        self.SATELLITE_CONVERSION_MODE = os.environ.get(
+            "SATELLITE_CONVERSION_MODE", "stream"
+        )
+        self.GIF_STREAM_CHUNK_SIZE = 1 << 20  # caracteres base64 por tramo
+        self.SATELLITE_LOOP_FRAMES = int(os.environ.get("SATELLITE_LOOP_FRAMES", 24))
+        self.SATELLITE_FRAME_DURATION = float(
+            os.environ.get("SATELLITE_FRAME_DURATION", 0.1)
+        )
         self.WEBCAM_OUTPUT_FOLDER = "output_webcams"
         self.SATELLITE_OUTPUT_FOLDER = "output_satellite"
+        self.CACHE_FOLDER = os.environ.get("CACHE_DIR", ".cache")
+        self.METRICS_FOLDER = os.environ.get("METRICS_DIR", "metrics")
+        # Intervalos (segundos) del modo daemon y fracción de jitter aleatorio
+        self.METAR_INTERVAL = int(os.environ.get("METAR_INTERVAL", 600))
+        self.STATIC_CAM_INTERVAL = int(os.environ.get("STATIC_CAM_INTERVAL", 600))
+        self.INTERACTIVE_CAM_INTERVAL = int(
+            os.environ.get("INTERACTIVE_CAM_INTERVAL", 1800)
+        )
+        self.SATELLITE_INTERVAL = int(os.environ.get("SATELLITE_INTERVAL", 3600))
+        self.SCHEDULE_JITTER = float(os.environ.get("SCHEDULE_JITTER", 0.1))
+        self.METRICS_KEEP = int(os.environ.get("METRICS_KEEP", 200))
+        # Frames sin cambios: "skip" los omite, "mark" los reenvía marcados
+        self.UNCHANGED_FRAMES = os.environ.get("UNCHANGED_FRAMES", "skip")
+        self.frame_cache = None
+        # Post-procesado de imágenes antes del envío (requiere Pillow): recorte de
+        # bordes uniformes, reescalado, recompresión y descarte de frames en
+        # blanco o congelados. Corre en un pool de procesos.
+        self.IMAGE_POSTPROCESS = os.environ.get("IMAGE_POSTPROCESS", "on") == "on"
+        self.IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+        self.IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", 1280))
+        self.IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "jpeg")
+        self.IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 82))
+        # Desviación estándar mínima de luminancia; por debajo el frame es "en blanco"
+        self.BLANK_FRAME_STDDEV = float(os.environ.get("BLANK_FRAME_STDDEV", 4))
+        # Bits distintos (de 64) del dHash hasta los que un frame cuenta como congelado
+        self.FROZEN_FRAME_DISTANCE = int(os.environ.get("FROZEN_FRAME_DISTANCE", 2))
+        self.image_executor = None
+        # Vigencia de la URL de imagen resuelta desde el HTML de cada cámara
+        self.IMAGE_URL_TTL = int(os.environ.get("IMAGE_URL_TTL", 6 * 3600))
 
-    def _get_camera_config(self):
-        return [
-            {
-                "name": "Cartago",
-                "page_url": "https://cartagoenvivo.com/",
-                "base_url": "https://cartagoenvivo.com/",
-                "image_id": "liveImage",
-                "type": "image",
-            },
-            {
-                "name": "Volcan Turrialba",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-v-turrialba",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "interactive_simple",  # <-- CAMBIO
-            },
-            {
-                "name": "Volcan Irazu",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-2-v-turrialba",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "interactive_simple",  # <-- CAMBIO
-            },
-            {
-                "name": "Poas Crater",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-crater-v-poas",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "image",  # Esta usualmente funciona bien, la dejamos estática
-            },
-            {
-                "name": "Poas SO del Crater",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-v-poas-so-del-crater",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "interactive_simple",  # <-- CAMBIO
-            },
-            {
-                "name": "Poas Chahuites",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-v-poas-chahuites",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "image",  # Esta usualmente funciona bien, la dejamos estática
-            },
-            {
-                "name": "Rincon de la Vieja Sensoria",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/rincon-de-la-vieja-sensoria2",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "interactive_simple",  # <-- CAMBIO
-            },
-            {
-                "name": "Rincon de la Vieja Curubande",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/camara-v-rincon-de-la-vieja-curubande",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "image",
-            },
-            {
-                "name": "Rincon de la Vieja Gavilan",
-                "page_url": "https://www.ovsicori.una.ac.cr/index.php/vulcanologia/camara-volcanes-2/rincon-de-la-vieja-gavilan",
-                "base_url": "https://www.ovsicori.una.ac.cr",
-                "image_id": "camara",
-                "type": "image",
-            },
-            {
-                "name": "Reserva Karen Mogensen",
-                "page_url": "https://www.forestepersempre.org/fps/progetti/CostaRica/webcam/Karen-webcam.html",
-                "base_url": "https://www.forestepersempre.org",
-                "image_id": "webcam",
-                "type": "image",
-            },
-            {
-                "name": "Cobano Skyline",
-                "page_url": "https://www.skylinewebcams.com/webcam/costa-rica/puntarenas/puntarenas/cobano.html?w=4652",
-                "type": "interactive",
-            },
-        ]
+    def _frame_result(
+        self, cam_name, path, content, etag=None, last_modified=None, screenshot=False
+    ):
+        # El hash y los validadores se guardan recién cuando Telegram recibe el
+        # frame (on_sent); un envío fallido se vuelve a intentar en la próxima.
+        digest = self.frame_cache.digest(content)
+        on_sent = partial(
+            self.frame_cache.commit, cam_name, path, digest, etag, last_modified
+        )
+        if self.frame_cache.is_new(cam_name, digest):
+            return (path, cam_name, on_sent, screenshot)
+        # Igual al último enviado: solo se refrescan los validadores
+        on_sent()
+        return self._unchanged_frame(cam_name)
 
-    def _get_satellite_maps_config(self):
-        return {
-            "start_url": "https://rammb.cira.colostate.edu/ramsdis/online/rmtc.asp#Central_and_South_America",
-            "maps": [
-                {
-                    "id": "rmtc/rmtccosvis1",
-                    "caption": "Animación Satelital (Visible) - Costa Rica",
-                },
-                {
-                    "id": "rmtc/rmtccosvis2",
-                    "caption": "Animación Satelital (Infrarrojo) - Costa Rica",
-                },
-                {
-                    "id": "rmtc/rmtccosir22",
-                    "caption": "Animación Satelital (Infrarrojo Onda Corta) - CR",
-                },
-                {
-                    "id": "rmtc/rmtccosir42",
-                    "caption": "Animación Satelital (Vapor de Agua) - CR",
-                },
-            ],
-        }
+    def _unchanged_frame(self, cam_name):
+        if self.UNCHANGED_FRAMES == "mark":
+            frame = self.frame_cache.frame_path(cam_name)
+            if frame:
+                logging.info(f"Imagen '{cam_name}' sin cambios; se envía marcada.")
+                run_metrics.set_outcome("unchanged")
+                return (frame, f"{cam_name} (sin cambios)", None, False)
+        logging.info(f"Imagen '{cam_name}' sin cambios desde la última ejecución.")
+        run_metrics.set_outcome("unchanged")
+        return None
+
+    async def _resolve_image_url(self, camera_config):
+        finder = ImgTagFinder(camera_config["image_id"])
+        async with self.http_pool.stream(
+            "GET", camera_config["page_url"], timeout=20
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_text():
+                finder.feed(chunk)
+                if finder.src:
+                    break
+            run_metrics.add_bytes(response.num_bytes_downloaded)
+        if not finder.src:
+            return None
+        abs_url = urljoin(camera_config["base_url"], finder.src)
+        self.frame_cache.set_resolved_url(camera_config["name"], abs_url)
+        return abs_url
+
+    async def _get_webcam_image(self, cam_name, url):
+        return await self.http_pool.get(
+            url,
+            timeout=20,
+            headers=self.frame_cache.conditional_headers(cam_name),
+        )
+
+    @staticmethod
+    def _is_image_response(response):
+        if response.status_code == 304:
+            return True
+        if response.status_code != 200 or not response.content:
+            return False
+        content_type = response.headers.get("Content-Type", "").strip().lower()
+        if content_type:
+            return content_type.startswith("image/")
+        # Sin Content-Type se decide por los primeros bytes
+        content = response.content
+        return content.startswith(IMAGE_SIGNATURES) or (
+            content[:4] == b"RIFF" and content[8:12] == b"WEBP"
+        )
 
-    def get_static_webcam_image(self, camera_config):
+    async def get_static_webcam_image(self, camera_config):
         cam_name = camera_config["name"]
         try:
             logging.info(f"📡 Procesando cámara estática: {cam_name}")
-            response = requests.get(camera_config["page_url"], timeout=20)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            img_tag = soup.find("img", {"id": camera_config["image_id"]})
-            if not img_tag or not img_tag.get("src"):
-                logging.warning(f"No se encontró el tag de imagen para '{cam_name}'.")
-                return None
-            abs_url = urljoin(camera_config["base_url"], img_tag["src"])
-            img_response = requests.get(abs_url, timeout=20)
+            img_response = None
+            abs_url = self.frame_cache.resolved_url(cam_name, self.IMAGE_URL_TTL)
+            if abs_url:
+                img_response = await self._get_webcam_image(cam_name, abs_url)
+                if not self._is_image_response(img_response):
+                    run_metrics.add_retry()
+                    logging.info(
+                        f"URL en caché de '{cam_name}' no válida "
+                        f"({img_response.status_code}); se vuelve a resolver."
+                    )
+                    img_response = None
+
+            if img_response is None:
+                abs_url = await self._resolve_image_url(camera_config)
+                if not abs_url:
+                    logging.warning(
+                        f"No se encontró el tag de imagen para '{cam_name}'."
+                    )
+                    run_metrics.set_outcome("error", "img tag not found")
+                    return None
+                img_response = await self._get_webcam_image(cam_name, abs_url)
+
+            if img_response.status_code == 304:
+                return self._unchanged_frame(cam_name)
             img_response.raise_for_status()
+            run_metrics.add_bytes(len(img_response.content))
             if img_response.content:
                 filename = f"{cam_name.replace(' ', '_').lower()}.jpg"
                 path = os.path.join(self.WEBCAM_OUTPUT_FOLDER, filename)
                 with open(path, "wb") as f:
                     f.write(img_response.content)
                 logging.info(f"Imagen '{cam_name}' guardada.")
-                return (path, cam_name)
+                return self._frame_result(
+                    cam_name,
+                    path,
+                    img_response.content,
+                    etag=img_response.headers.get("ETag"),
+                    last_modified=img_response.headers.get("Last-Modified"),
+                )
             logging.warning(f"Imagen '{cam_name}' descargada pero vacía.")
+            run_metrics.set_outcome("error", "empty image")
         except Exception as e:
             logging.error(f"Error con la cámara '{cam_name}': {e}", exc_info=True)
+            run_metrics.set_outcome("error", e)
         return None
 
+    @staticmethod
+    async def _wait_until_ready(description, condition, timeout):
+        # Si la señal no llega dentro del límite se continúa igual, como con
+        # el sleep fijo de antes, pero sin esperar de más cuando sí llega.
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        started = time.monotonic()
+        try:
+            await condition
+            logging.info(f"{description}: listo en {time.monotonic() - started:.1f}s.")
+            return True
+        except PlaywrightTimeoutError:
+            logging.warning(
+                f"{description}: sin señal tras {timeout:.0f}s; se continúa."
+            )
+            return False
+
+    @staticmethod
+    async def _block_unneeded_resources(route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+            keyword in request.url for keyword in BLOCKED_URL_KEYWORDS
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
     # --- NUEVA FUNCIÓN para cámaras dinámicas simples (OVSICORI) ---
     async def get_simple_interactive_image(self, camera_config):
         cam_name = camera_config["name"]
         logging.info(f"📸 Procesando cámara dinámica simple con Playwright: {cam_name}")
-        async with async_playwright() as p:
-            browser = None
-            try:
-                browser = await p.chromium.connect_over_cdp(
-                    self.browserless_url, timeout=120000
-                )
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36"
-                )
-                page = await context.new_page()
-                await page.goto(
-                    camera_config["page_url"],
-                    wait_until="domcontentloaded",
-                    timeout=60000,
-                )
+        try:
+            async with self.browser_pool.page(user_agent=USER_AGENT) as page:
+                await page.route("**/*", self._block_unneeded_resources)
+                image_responses = {}
+
+                def remember_image(response):
+                    # Se indexa también por las URLs previas a redirecciones
+                    request = response.request
+                    if request.resource_type != "image":
+                        return
+                    while request is not None:
+                        image_responses[request.url] = response
+                        request = request.redirected_from
+
+                page.on("response", remember_image)
+                with run_metrics.span("page_navigation", source=cam_name):
+                    await page.goto(
+                        camera_config["page_url"],
+                        wait_until="domcontentloaded",
+                        timeout=60000,
+                    )
 
                 image_selector = f"img#{camera_config['image_id']}"
                 await page.wait_for_selector(
@@ -201,202 +416,619 @@ class BotController:
                 )
 
                 element = page.locator(image_selector)
+                await self._wait_until_ready(
+                    f"Imagen de '{cam_name}'",
+                    page.wait_for_function(
+                        """(selector) => {
+                            const img = document.querySelector(selector);
+                            return img && img.complete && img.naturalWidth > 0;
+                        }""",
+                        arg=image_selector,
+                        timeout=self.IMAGE_READY_TIMEOUT * 1000,
+                    ),
+                    self.IMAGE_READY_TIMEOUT,
+                )
 
-                filename = f"{cam_name.replace(' ', '_').lower()}.png"
-                path = os.path.join(self.WEBCAM_OUTPUT_FOLDER, filename)
-
-                await element.screenshot(path=path)
+                # Bytes originales del JPEG tal como llegaron por la red
+                src = await element.evaluate("img => img.currentSrc || img.src")
+                response = image_responses.get(src)
+                content = await response.body() if response and response.ok else None
+                if content:
+                    content_type = response.headers.get("content-type", "")
+                    extension = IMAGE_EXTENSIONS.get(
+                        content_type.split(";")[0].strip(), ".jpg"
+                    )
+                    filename = f"{cam_name.replace(' ', '_').lower()}{extension}"
+                    path = os.path.join(self.WEBCAM_OUTPUT_FOLDER, filename)
+                    with open(path, "wb") as f:
+                        f.write(content)
+                else:
+                    logging.info(
+                        f"Sin respuesta de red para la imagen de '{cam_name}'; "
+                        "se usa captura de pantalla."
+                    )
+                    filename = f"{cam_name.replace(' ', '_').lower()}.png"
+                    path = os.path.join(self.WEBCAM_OUTPUT_FOLDER, filename)
+                    content = await element.screenshot(path=path)
+                run_metrics.add_bytes(len(content))
 
                 logging.info(f"Captura simple '{cam_name}' guardada.")
-                return (path, cam_name)
-            except Exception as e:
-                logging.error(
-                    f"Error con la cámara dinámica simple '{cam_name}': {e}",
-                    exc_info=True,
-                )
-                return None
-            finally:
-                if browser:
-                    await browser.close()
+                return self._frame_result(cam_name, path, content)
+        except Exception as e:
+            logging.error(
+                f"Error con la cámara dinámica simple '{cam_name}': {e}",
+                exc_info=True,
+            )
+            run_metrics.set_outcome("error", e)
+            return None
 
     async def get_interactive_webcam_image(self, camera_config):
         cam_name = camera_config["name"]
         logging.info(f"🤖 Procesando cámara interactiva con Playwright: {cam_name}")
-        async with async_playwright() as p:
-            browser = None
-            try:
-                # --- CAMBIO: Usar connect_over_cdp y aumentar timeout ---
-                browser = await p.chromium.connect_over_cdp(
-                    self.browserless_url, timeout=120000
-                )
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
-                    viewport={"width": 1920, "height": 1080},
-                )
-                page = await context.new_page()
-
-                await page.goto(
-                    camera_config["page_url"], wait_until="networkidle", timeout=60000
-                )
+        try:
+            async with self.browser_pool.page(
+                user_agent=USER_AGENT,
+                viewport={"width": 1920, "height": 1080},
+            ) as page:
+                with run_metrics.span("page_navigation", source=cam_name):
+                    await page.goto(
+                        camera_config["page_url"],
+                        wait_until="networkidle",
+                        timeout=60000,
+                    )
                 await page.wait_for_selector(".play-wrapper", timeout=25000)
                 await page.evaluate('document.querySelector(".play-wrapper").click()')
-                await asyncio.sleep(30)
+                await self._wait_until_ready(
+                    f"Video de '{cam_name}' reproduciendo",
+                    page.wait_for_function(
+                        VIDEO_FRAME_READY_JS, timeout=self.VIDEO_READY_TIMEOUT * 1000
+                    ),
+                    self.VIDEO_READY_TIMEOUT,
+                )
                 await page.wait_for_selector("button[data-fullscreen]", timeout=10000)
                 await page.click("button[data-fullscreen]")
-                await asyncio.sleep(3)
+                await self._wait_until_ready(
+                    f"Pantalla completa de '{cam_name}'",
+                    page.wait_for_function(
+                        "() => document.fullscreenElement !== null",
+                        timeout=self.FULLSCREEN_READY_TIMEOUT * 1000,
+                    ),
+                    self.FULLSCREEN_READY_TIMEOUT,
+                )
 
                 filename = f"{cam_name.replace(' ', '_').lower()}.png"
                 path = os.path.join(self.WEBCAM_OUTPUT_FOLDER, filename)
-                await page.screenshot(path=path, full_page=True)
+                content = await page.screenshot(path=path, full_page=True)
+                run_metrics.add_bytes(len(content))
 
                 logging.info(f"Captura interactiva '{cam_name}' guardada.")
-                return (path, cam_name)
-            except Exception as e:
-                logging.error(
-                    f"Error con la cámara interactiva '{cam_name}': {e}", exc_info=True
+                # Pantalla completa de la página: puede traer barras del reproductor
+                return self._frame_result(cam_name, path, content, screenshot=True)
+        except Exception as e:
+            logging.error(
+                f"Error con la cámara interactiva '{cam_name}': {e}", exc_info=True
+            )
+            run_metrics.set_outcome("error", e)
+            return None
+
+    async def _postprocess_image(
+        self, cam_name, path, caption, on_sent=None, screenshot=False
+    ):
+        import image_processing
+
+        loop = asyncio.get_running_loop()
+        try:
+            with run_metrics.span("image_postprocess", source=cam_name) as span:
+                info = await loop.run_in_executor(
+                    self.image_executor,
+                    partial(
+                        image_processing.process_image,
+                        path,
+                        self.WEBCAM_OUTPUT_FOLDER,
+                        self.IMAGE_MAX_DIMENSION,
+                        self.IMAGE_FORMAT,
+                        self.IMAGE_QUALITY,
+                        self.BLANK_FRAME_STDDEV,
+                        crop_border=screenshot,
+                    ),
                 )
-                return None
-            finally:
-                if browser:
-                    await browser.close()
+                span.bytes = info.get("bytes_out", 0)
+        except Exception as e:
+            logging.warning(
+                f"No se pudo post-procesar '{cam_name}' ({e}); se envía el original."
+            )
+            return (path, caption, on_sent)
+
+        if info["status"] == "blank":
+            logging.info(
+                f"Imagen '{cam_name}' en blanco (desviación {info['stddev']}); "
+                "no se envía."
+            )
+            run_metrics.set_outcome("blank")
+            return None
+
+        # Los frames reenviados desde la caché (modo "mark") ya se sabe que no
+        # cambiaron; la detección de congelados aplica solo a capturas nuevas.
+        previous = self.frame_cache.perceptual_hash(cam_name)
+        fresh = os.path.dirname(path) != self.frame_cache.folder
+        if (
+            fresh
+            and previous
+            and image_processing.hash_distance(previous, info["dhash"])
+            <= self.FROZEN_FRAME_DISTANCE
+        ):
+            logging.info(f"Imagen '{cam_name}' congelada (igual a la última enviada).")
+            run_metrics.set_outcome("frozen")
+            return None
+
+        def sent():
+            self.frame_cache.set_perceptual_hash(cam_name, info["dhash"])
+            if on_sent:
+                on_sent()
+
+        logging.info(
+            f"Imagen '{cam_name}' post-procesada: {info['bytes_in'] / 1024:.0f} KiB "
+            f"-> {info['bytes_out'] / 1024:.0f} KiB ({info['size'][0]}x{info['size'][1]})."
+        )
+        return (info["path"], caption, sent)
+
+    async def _traced_camera(self, camera, capture, on_image=None):
+        started = time.monotonic()
+        with run_metrics.span(
+            "camera", source=camera["name"], type=camera["type"]
+        ) as span:
+            result = await capture
+            if result:
+                path, caption, on_sent, screenshot = result
+                result = (path, caption, on_sent)
+                if self.image_executor is not None:
+                    result = await self._postprocess_image(
+                        camera["name"], path, caption, on_sent, screenshot
+                    )
+        # "unchanged", "blank" o "frozen" también cuentan: la fuente respondió
+        if span.outcome == "error":
+            self.source_health.record_failure(camera["name"])
+        else:
+            self.source_health.record_success(
+                camera["name"], time.monotonic() - started
+            )
+        if result and on_image:
+            on_image(*result)
+        return result
+
+    async def _guarded_camera(self, camera, capture, on_image=None):
+        # Timeout adaptativo (p95 histórico) y circuito abierto para las
+        # cámaras que fallan seguido, en lugar del mismo límite fijo para todas.
+        cam_name = camera["name"]
+        cam_type = camera["type"]
+        if not self.source_health.allow(cam_name):
+            capture.close()
+            logging.info(
+                f"Cámara '{cam_name}' omitida: circuito abierto "
+                f"(nuevo intento en {self.source_health.retry_in(cam_name) / 60:.0f} min)."
+            )
+            with run_metrics.span("camera", source=cam_name, type=cam_type):
+                run_metrics.set_outcome("skipped")
+            return None
+
+        default = (
+            self.STATIC_CAM_TIMEOUT
+            if cam_type == "image"
+            else self.INTERACTIVE_CAM_TIMEOUT
+        )
+        timeout = self.source_health.timeout(
+            cam_name,
+            default,
+            margin=self.HEALTH_TIMEOUT_MARGIN,
+            minimum=self.HEALTH_TIMEOUT_MIN,
+        )
+        # La espera por cupo queda fuera del timeout: solo cuenta la captura
+        async with self.scheduler.slot(
+            CAMERA_BACKENDS[cam_type], urlsplit(camera["page_url"]).hostname
+        ):
+            try:
+                return await asyncio.wait_for(
+                    self._traced_camera(camera, capture, on_image), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                self.source_health.record_failure(cam_name)
+                raise asyncio.TimeoutError(f"sin respuesta tras {timeout:.1f}s")
 
     # --- FUNCIÓN ACTUALIZADA para procesar todas las cámaras en paralelo ---
-    async def get_all_webcam_images(self):
+    async def get_all_webcam_images(self, cameras=None, on_image=None):
         logging.info("Iniciando descarga de imágenes de webcams.")
-        image_data = []
+        cameras = self.cam_config if cameras is None else cameras
+        cameras = self.scheduler.order(
+            cameras,
+            lambda camera: self.source_health.expected_latency(
+                camera["name"], EXPECTED_CAMERA_LATENCY[camera["type"]]
+            ),
+        )
+        captures = {
+            "image": self.get_static_webcam_image,
+            "interactive_simple": self.get_simple_interactive_image,
+            "interactive": self.get_interactive_webcam_image,
+        }
 
-        tasks = []
-        for camera in self.cam_config:
+        # Cada tarea queda emparejada con su cámara, aunque alguna no se cree
+        scheduled = []
+        for camera in cameras:
             try:
-                if camera.get("type") == "interactive":
-                    tasks.append(
-                        asyncio.wait_for(
-                            self.get_interactive_webcam_image(camera),
-                            timeout=self.INTERACTIVE_CAM_TIMEOUT,
-                        )
-                    )
-                elif camera.get("type") == "interactive_simple":
-                    tasks.append(
-                        asyncio.wait_for(
-                            self.get_simple_interactive_image(camera),
-                            timeout=self.INTERACTIVE_CAM_TIMEOUT,
-                        )
-                    )
-                else:
-                    tasks.append(
-                        asyncio.to_thread(self.get_static_webcam_image, camera)
-                    )
+                capture = captures[camera["type"]](camera)
+                scheduled.append(
+                    (camera, self._guarded_camera(camera, capture, on_image))
+                )
             except Exception as e:
                 logging.error(f"Error al crear tarea para {camera['name']}: {e}")
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for i, res in enumerate(results):
-            if i < len(self.cam_config):
-                cam_name = self.cam_config[i]["name"]
-                if isinstance(res, Exception):
-                    logging.error(f"Falló la tarea para la cámara '{cam_name}': {res}")
-                elif res:
-                    image_data.append(res)
+        results = await asyncio.gather(
+            *(task for _, task in scheduled), return_exceptions=True
+        )
 
+        image_data = []
+        for (camera, _), res in zip(scheduled, results):
+            if isinstance(res, Exception):
+                logging.error(
+                    f"Falló la tarea para la cámara '{camera['name']}': {res}"
+                )
+            elif res:
+                image_data.append(res)
         return image_data
 
-    async def generate_and_send_satellite_videos(self, bot):
-        logging.info("Iniciando generación de videos satelitales con Playwright.")
-        async with async_playwright() as p:
-            browser = None
+    @asynccontextmanager
+    async def _open_satellite_loop(self, map_id):
+        config = self.satellite_maps
+        # Misma cola "browser" que las cámaras: con el cupo del planificador
+        # igual al del pool, una cámara que ya tiene su cupo nunca espera
+        # página dentro de su timeout porque el satélite la ocupó por fuera.
+        async with self.scheduler.slot(
+            "browser", urlsplit(config["start_url"]).hostname
+        ), self.browser_pool.page() as page:
+            with run_metrics.span("page_navigation", source=map_id):
+                await page.goto(config["start_url"], wait_until="load", timeout=90000)
+                await page.click(f'a[href*="data_folder={map_id}"]')
+            await page.wait_for_selector(
+                "#downloadLoop", state="visible", timeout=90000
+            )
+            await self._wait_until_ready(
+                f"Frames del mapa {map_id}",
+                page.wait_for_load_state(
+                    "networkidle", timeout=self.SATELLITE_READY_TIMEOUT * 1000
+                ),
+                self.SATELLITE_READY_TIMEOUT,
+            )
+            await page.evaluate('document.querySelector("#downloadLoop").click()')
+            img_locator = page.locator("#animatedGifWrapper img")
+            await img_locator.wait_for(state="visible", timeout=120000)
+            yield img_locator
+
+    async def _iter_gif_bytes(self, img_locator):
+        # Lee el data URL por tramos desde la página y los decodifica sobre la
+        # marcha; nunca se tiene el GIF completo en memoria ni en disco.
+        chunk_size = self.GIF_STREAM_CHUNK_SIZE
+        total, start = await img_locator.evaluate(
+            "img => [img.src.length, img.src.indexOf(',') + 1]"
+        )
+        pending = ""
+        for offset in range(start, total, chunk_size):
+            pending += await img_locator.evaluate(
+                "(img, [a, b]) => img.src.slice(a, b)", [offset, offset + chunk_size]
+            )
+            usable = len(pending) - len(pending) % 4
+            run_metrics.add_bytes(usable)
+            yield base64.b64decode(pending[:usable])
+            pending = pending[usable:]
+        if pending:
+            yield base64.b64decode(pending)
+
+    def _temp_video_path(self, slug):
+        # /dev/shm es memoria; si no existe se usa la carpeta de salida
+        folder = (
+            "/dev/shm" if os.path.isdir("/dev/shm") else self.SATELLITE_OUTPUT_FOLDER
+        )
+        fd, path = tempfile.mkstemp(prefix=f"{slug}_", suffix=".mp4", dir=folder)
+        os.close(fd)
+        return path
+
+    @staticmethod
+    def _write_data_url(data_url, path):
+        _, encoded_data = data_url.split(",", 1)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(encoded_data))
+
+    async def _satellite_mp4_stream(self, map_id, slug, conversion_semaphore):
+        async with self._open_satellite_loop(map_id) as img_locator:
+            mp4_path = self._temp_video_path(slug)
             try:
-                # --- CAMBIO: Usar connect_over_cdp y aumentar timeout ---
-                browser = await p.chromium.connect_over_cdp(
-                    self.browserless_url, timeout=120000
+                async with conversion_semaphore:
+                    with run_metrics.span("ffmpeg", source=map_id, mode="stream"):
+                        converted = await self.convert_gif_stream_to_mp4(
+                            self._iter_gif_bytes(img_locator), mp4_path
+                        )
+            except BaseException:
+                os.remove(mp4_path)
+                raise
+        return mp4_path, converted
+
+    async def _satellite_mp4_file(
+        self, map_id, slug, capture_semaphore, conversion_semaphore
+    ):
+        # Solo la captura ocupa un cupo del navegador; la conversión del GIF ya
+        # descargado se solapa con la captura del siguiente mapa.
+        async with capture_semaphore:
+            async with self._open_satellite_loop(map_id) as img_locator:
+                with run_metrics.span("gif_download", source=map_id, mode="browser"):
+                    data_url = await img_locator.get_attribute("src")
+                    run_metrics.add_bytes(len(data_url))
+
+        # Nombres únicos por mapa para que las conversiones puedan solaparse
+        gif_path = os.path.join(self.SATELLITE_OUTPUT_FOLDER, f"{slug}.gif")
+        mp4_path = os.path.join(self.SATELLITE_OUTPUT_FOLDER, f"{slug}.mp4")
+        await asyncio.to_thread(self._write_data_url, data_url, gif_path)
+        del data_url
+
+        async with conversion_semaphore:
+            with run_metrics.span("ffmpeg", source=map_id, mode="file"):
+                converted = await asyncio.to_thread(
+                    self.convert_gif_to_mp4, gif_path, mp4_path
                 )
-                context = await browser.new_context()
-                page = await context.new_page()
+        return mp4_path, converted
 
-                config = self.satellite_maps
-                for i, mapa in enumerate(config["maps"]):
-                    map_id, map_caption = mapa["id"], mapa["caption"]
-                    logging.info(
-                        f"Procesando Mapa Satelital {i + 1}/{len(config['maps'])}: {map_caption}"
-                    )
+    async def _list_satellite_frames(self, map_id):
+        config = self.satellite_maps
+        page_url = config["frames_url"].format(
+            map_id=map_id, count=self.SATELLITE_LOOP_FRAMES
+        )
+        response = await self.http_pool.get(page_url, timeout=30)
+        response.raise_for_status()
+        pattern = re.compile(
+            rf"[\w/.-]*{re.escape(map_id)}[\w/.-]*?_(\d{{8,14}})(\.(?:gif|jpg|png))"
+        )
+        frames = {}
+        for match in pattern.finditer(response.text):
+            timestamp, extension = match.group(1), match.group(2)
+            frames[timestamp] = (urljoin(page_url, match.group(0)), extension)
+        return sorted((ts, url, ext) for ts, (url, ext) in frames.items())
 
-                    await page.goto(
-                        config["start_url"], wait_until="load", timeout=90000
-                    )
-                    await page.click(f'a[href*="data_folder={map_id}"]')
-                    await page.wait_for_selector(
-                        "#downloadLoop", state="visible", timeout=90000
-                    )
-                    await asyncio.sleep(5)
-                    await page.evaluate(
-                        'document.querySelector("#downloadLoop").click()'
-                    )
-                    img_locator = page.locator("#animatedGifWrapper img")
-                    await img_locator.wait_for(state="visible", timeout=120000)
-                    data_url = await img_locator.get_attribute("src")
+    async def _fetch_satellite_frame(self, store, timestamp, url, extension):
+        response = await self.http_pool.get(url, timeout=30)
+        response.raise_for_status()
+        run_metrics.add_bytes(len(response.content))
+        store.add(timestamp, extension, response.content)
+
+    async def _satellite_mp4_incremental(self, map_id, slug, conversion_semaphore):
+        store = SatelliteFrameStore(
+            os.path.join(self.CACHE_FOLDER, "satellite", slug),
+            max_frames=self.SATELLITE_LOOP_FRAMES,
+        )
+        latest = store.latest()
+        available = await self._list_satellite_frames(map_id)
+        if not available:
+            # Página sin frames reconocibles (p. ej. cambió su formato): no se
+            # reenvía el loop guardado, se pasa al navegador
+            logging.warning(f"Mapa {map_id}: la lista de frames llegó vacía.")
+            return None, False
+        new_frames = [f for f in available if f[0] > latest][
+            -self.SATELLITE_LOOP_FRAMES :
+        ]
+        logging.info(
+            f"Mapa {map_id}: {len(available)} frames publicados, {len(new_frames)} nuevos."
+        )
+        if not new_frames:
+            # Sin frames nuevos el loop sería el mismo que ya se envió
+            return None
+        with run_metrics.span("gif_download", source=map_id, mode="incremental"):
+            await asyncio.gather(
+                *(self._fetch_satellite_frame(store, *frame) for frame in new_frames)
+            )
+        store.prune()
+        if len(store.frames()) < 2:
+            return None, False
+
+        list_path = store.write_concat_list(self.SATELLITE_FRAME_DURATION)
+        mp4_path = self._temp_video_path(slug)
+        async with conversion_semaphore:
+            with run_metrics.span("ffmpeg", source=map_id, mode="frames"):
+                converted = await self.convert_frames_to_mp4(list_path, mp4_path)
+        if not converted:
+            os.remove(mp4_path)
+            return None, False
+        return mp4_path, True
+
+    async def _process_satellite_map(
+        self, mapa, index, total, capture_semaphore, conversion_semaphore
+    ):
+        map_id, map_caption = mapa["id"], mapa["caption"]
+        slug = map_id.replace("/", "_")
+        streaming = self.SATELLITE_CONVERSION_MODE == "stream"
+        mp4_path, converted, temporary = None, False, False
+        with run_metrics.span("satellite_map", source=map_id):
+            try:
+                logging.info(
+                    f"Procesando Mapa Satelital {index + 1}/{total}: {map_caption}"
+                )
+                if self.SATELLITE_MODE == "incremental":
+                    try:
+                        result = await self._satellite_mp4_incremental(
+                            map_id, slug, conversion_semaphore
+                        )
+                        if result is None:
+                            logging.info(
+                                f"Mapa '{map_caption}' sin frames nuevos; no se reenvía."
+                            )
+                            run_metrics.set_outcome("unchanged")
+                            return
+                        mp4_path, converted = result
+                        temporary = converted
+                    except Exception as e:
+                        logging.warning(
+                            f"Loop incremental falló para '{map_caption}': {e}"
+                        )
+                    if not converted:
+                        logging.info(f"Usando el navegador para '{map_caption}'.")
 
-                    _, encoded_data = data_url.split(",", 1)
-                    gif_path = os.path.join(self.SATELLITE_OUTPUT_FOLDER, "temp.gif")
-                    with open(gif_path, "wb") as f:
-                        f.write(base64.b64decode(encoded_data))
-
-                    mp4_path = os.path.join(self.SATELLITE_OUTPUT_FOLDER, "video.mp4")
-                    if self.convert_gif_to_mp4(gif_path, mp4_path):
-                        await self.send_video_to_telegram(bot, mp4_path, map_caption)
-                    else:
-                        logging.error(
-                            "Envío omitido por error en la conversión de GIF a MP4."
+                if not converted and streaming:
+                    async with capture_semaphore:
+                        mp4_path, converted = await self._satellite_mp4_stream(
+                            map_id, slug, conversion_semaphore
                         )
+                        temporary = True
+                elif not converted:
+                    mp4_path, converted = await self._satellite_mp4_file(
+                        map_id, slug, capture_semaphore, conversion_semaphore
+                    )
+
+                if converted:
+                    await self.delivery.send_video(mp4_path, map_caption)
+                else:
+                    logging.error(
+                        "Envío omitido por error en la conversión de GIF a MP4."
+                    )
+                    run_metrics.set_outcome("error", "conversion failed")
             except Exception as e:
-                logging.error(f"Error en el proceso satelital: {e}", exc_info=True)
+                logging.error(
+                    f"Error en el mapa satelital '{map_caption}': {e}", exc_info=True
+                )
+                run_metrics.set_outcome("error", e)
             finally:
-                if browser:
-                    await browser.close()
+                if temporary and mp4_path and os.path.exists(mp4_path):
+                    os.remove(mp4_path)
+
+    # --- Etapas en paralelo: captura -> conversión -> envío, por mapa ---
+    async def generate_and_send_satellite_videos(self):
+        logging.info("Iniciando generación de videos satelitales con Playwright.")
+        maps = self.satellite_maps["maps"]
+        capture_semaphore = asyncio.Semaphore(self.SATELLITE_CAPTURE_CONCURRENCY)
+        conversion_semaphore = asyncio.Semaphore(self.SATELLITE_CONVERSION_WORKERS)
+        await asyncio.gather(
+            *(
+                self._process_satellite_map(
+                    mapa, i, len(maps), capture_semaphore, conversion_semaphore
+                )
+                for i, mapa in enumerate(maps)
+            )
+        )
+
+    async def _fetch_aviation_batch(self, api_url, kind, icaos):
+        # Una llamada por lote de estaciones; None si el lote falló
+        url = f"{api_url}?ids={','.join(icaos)}&format=json"
+        with run_metrics.span("metar_batch", kind=kind, stations=len(icaos)):
+            try:
+                response = await self.http_pool.get(url, timeout=20)
+                response.raise_for_status()
+                run_metrics.add_bytes(len(response.content))
+                return response.json() if response.content else []
+            except Exception as e:
+                logging.error(
+                    f"Error obteniendo {kind.upper()} ({','.join(icaos)}): {e}",
+                    exc_info=True,
+                )
+                run_metrics.set_outcome("error", e)
+                return None
 
-    def get_metar_reports(self):
+    async def get_metar_reports(self):
+        # Devuelve el texto con las estaciones cuyo METAR o TAF cambió desde el
+        # último envío (o None si no hay nada nuevo) y el callback que lo
+        # registra como enviado.
         logging.info("Obteniendo reportes METAR.")
-        api_url = f"https://aviationweather.gov/api/data/metar?ids={','.join(self.metar_icaos)}&format=json"
-        report_text = (
+        due = [
+            icao
+            for icao in self.metar_icaos
+            if self.observations.due(icao, self.METAR_REFRESH)
+        ]
+        if not due:
+            logging.info("Ninguna estación tiene un METAR nuevo pendiente.")
+            return None, None
+
+        batches = [
+            due[i : i + self.METAR_BATCH_SIZE]
+            for i in range(0, len(due), self.METAR_BATCH_SIZE)
+        ]
+        with run_metrics.span("metar", stations=len(due)):
+            fetches = [
+                self._fetch_aviation_batch(self.metar_api_url, "metar", batch)
+                for batch in batches
+            ]
+            if self.TAF_ENABLED:
+                fetches += [
+                    self._fetch_aviation_batch(self.taf_api_url, "taf", batch)
+                    for batch in batches
+                ]
+            results = await asyncio.gather(*fetches)
+            metar_results = results[: len(batches)]
+            taf_results = results[len(batches) :]
+
+            # Lo nuevo se guarda en el almacén recién cuando el reporte llega a
+            # Telegram; si el envío falla, esas estaciones vuelven a salir.
+            pending = []
+            for kind, field, kind_results in (
+                ("metar", "rawOb", metar_results),
+                ("taf", "rawTAF", taf_results),
+            ):
+                for reports in filter(None, kind_results):
+                    for report in reports:
+                        icao, raw = report.get("icaoId"), report.get(field)
+                        if icao and raw and self.observations.is_new(icao, kind, raw):
+                            pending.append((icao, kind, raw, report.get("obsTime")))
+            changed = {icao for icao, _, _, _ in pending}
+
+        header = (
             f"*{'Reporte Meteorológico de Aeropuertos'}*\n_{datetime.datetime.now(datetime.timezone.utc).astimezone(datetime.timezone(datetime.timedelta(hours=-6))).strftime('%Y-%m-%d %I:%M %p %Z')}_\n"
             + ("-" * 30)
             + "\n\n"
         )
-        nombres = {
-            "MROC": "Juan Santamaría",
-            "MRPV": "Tobías Bolaños",
-            "MRLB": "Daniel Oduber",
-        }
-        try:
-            data = requests.get(api_url, timeout=20).json()
-            for reporte in data:
-                icao, metar = (
-                    reporte.get("icaoId", "N/A"),
-                    reporte.get("rawOb", "No disponible"),
-                )
-                nombre = nombres.get(icao, "")
-                report_text += f"*{icao} ({nombre})*:\n`{metar}`\n\n"
-            logging.info("Reportes METAR obtenidos con éxito.")
-        except Exception as e:
-            logging.error(f"Error obteniendo datos METAR: {e}", exc_info=True)
-            report_text += "No se pudieron obtener los datos meteorológicos."
-        return report_text
+        if all(result is None for result in metar_results):
+            return header + "No se pudieron obtener los datos meteorológicos.", None
+        if not changed:
+            logging.info("Reportes METAR sin cambios; no se envían.")
+            return None, None
+
+        # Solo se decodifican las estaciones que cambiaron
+        names = {station["icao"]: station["name"] for station in self.metar_stations}
+        latest = {(icao, kind): raw for icao, kind, raw, _ in pending}
+        report_text = header
+        for icao in self.metar_icaos:
+            entry = self.observations.entries.get(icao) or {}
+            metar = latest.get((icao, "metar"), entry.get("metar"))
+            if icao not in changed or not metar:
+                continue
+            record = decode_metar(metar)
+            report_text += format_station(
+                names.get(icao, ""),
+                icao,
+                record,
+                metar,
+                latest.get((icao, "taf"), entry.get("taf")),
+            )
+        logging.info(
+            f"Reportes METAR obtenidos: {len(changed)} estaciones con cambios."
+        )
+
+        def on_sent():
+            for update in pending:
+                self.observations.update(*update)
+
+        return report_text, on_sent
+
+    @staticmethod
+    def _ffmpeg_command(input_args, mp4_path):
+        return [
+            "ffmpeg",
+            *input_args,
+            "-movflags",
+            "faststart",
+            "-pix_fmt",
+            "yuv420p",
+            "-vf",
+            "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+            "-y",
+            mp4_path,
+        ]
 
     def convert_gif_to_mp4(self, gif_path, mp4_path):
         logging.info(f"Convirtiendo {os.path.basename(gif_path)} a MP4...")
         try:
-            command = [
-                "ffmpeg",
-                "-i",
-                gif_path,
-                "-movflags",
-                "faststart",
-                "-pix_fmt",
-                "yuv420p",
-                "-vf",
-                "scale=trunc(iw/2)*2:trunc(ih/2)*2",
-                "-y",
-                mp4_path,
-            ]
+            command = self._ffmpeg_command(["-i", gif_path], mp4_path)
             subprocess.run(
                 command,
                 check=True,
@@ -405,81 +1037,304 @@ class BotController:
             )
             logging.info("Conversión a MP4 completada.")
             return True
-        except FileNotFoundError:
+        except FileNotFoundError as e:
             logging.error("FATAL: FFmpeg no está instalado en el entorno de ejecución.")
+            run_metrics.set_outcome("error", e)
             return False
         except Exception as e:
             logging.error(f"Error en la conversión con FFmpeg: {e}", exc_info=True)
+            run_metrics.set_outcome("error", e)
             return False
 
-    async def send_report_to_telegram(self, bot, text_message, image_data):
-        logging.info("Enviando reporte principal a Telegram.")
+    async def convert_frames_to_mp4(self, list_path, mp4_path):
+        logging.info(f"Armando {os.path.basename(mp4_path)} desde frames...")
         try:
-            await bot.send_message(
-                chat_id=self.chat_id, text=text_message, parse_mode="Markdown"
+            process = await asyncio.create_subprocess_exec(
+                *self._ffmpeg_command(
+                    ["-f", "concat", "-safe", "0", "-i", list_path], mp4_path
+                ),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
             )
-            logging.info("Mensaje de texto (METAR) enviado.")
+        except FileNotFoundError as e:
+            logging.error("FATAL: FFmpeg no está instalado en el entorno de ejecución.")
+            run_metrics.set_outcome("error", e)
+            return False
+        returncode = await process.wait()
+        if returncode != 0:
+            logging.error(f"FFmpeg terminó con código {returncode}.")
+            run_metrics.set_outcome("error", f"ffmpeg exit {returncode}")
+            return False
+        logging.info("Conversión a MP4 completada.")
+        return True
 
-            media_group = [
-                telegram.InputMediaPhoto(open(path, "rb"), caption=name)
-                for path, name in image_data
-                if os.path.exists(path) and os.path.getsize(path) > 0
-            ]
-            if media_group:
-                for i in range(0, len(media_group), 10):
-                    chunk = media_group[i : i + 10]
-                    await bot.send_media_group(
-                        chat_id=self.chat_id,
-                        media=chunk,
-                        read_timeout=60,
-                        write_timeout=60,
-                    )
-                    logging.info(f"Grupo de {len(chunk)} imágenes enviado.")
-                    await asyncio.sleep(1)
-            else:
-                logging.warning("No hay imágenes válidas para enviar.")
-        except Exception as e:
-            logging.error(f"Error al enviar reporte a Telegram: {e}", exc_info=True)
+    async def convert_gif_stream_to_mp4(self, gif_chunks, mp4_path):
+        logging.info(f"Convirtiendo GIF (stream) a {os.path.basename(mp4_path)}...")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._ffmpeg_command(["-f", "gif", "-i", "pipe:0"], mp4_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except FileNotFoundError as e:
+            logging.error("FATAL: FFmpeg no está instalado en el entorno de ejecución.")
+            run_metrics.set_outcome("error", e)
+            return False
 
-    async def send_video_to_telegram(self, bot, video_path, caption):
-        logging.info(f"Enviando video '{os.path.basename(video_path)}' a Telegram.")
         try:
-            with open(video_path, "rb") as video_file:
-                await bot.send_video(
-                    chat_id=self.chat_id,
-                    video=video_file,
-                    caption=caption,
-                    supports_streaming=True,
-                    read_timeout=60,
-                    write_timeout=60,
-                )
-            logging.info("Video enviado con éxito.")
+            async for chunk in gif_chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # FFmpeg terminó antes de tiempo; el código de salida dirá por qué.
+            pass
         except Exception as e:
-            logging.error(f"Error al enviar video a Telegram: {e}", exc_info=True)
+            process.kill()
+            await process.wait()
+            logging.error(f"Error enviando el GIF a FFmpeg: {e}", exc_info=True)
+            run_metrics.set_outcome("error", e)
+            return False
+
+        returncode = await process.wait()
+        if returncode != 0:
+            logging.error(f"FFmpeg terminó con código {returncode}.")
+            run_metrics.set_outcome("error", f"ffmpeg exit {returncode}")
+            return False
+        logging.info("Conversión a MP4 completada.")
+        return True
+
+    def _create_bot(self):
+        import telegram
+
+        self.bot = telegram.Bot(
+            token=self.telegram_token, base_url=self.telegram_api_url
+        )
+        return self.bot
+
+    def _selected_cameras(self):
+        types = {
+            cam_type
+            for stage in self.stages
+            for cam_type in STAGE_CAMERA_TYPES.get(stage, ())
+        }
+        return [camera for camera in self.cam_config if camera["type"] in types]
+
+    def _start_resources(self):
+        # Los backends pesados se importan solo si alguna etapa elegida los usa:
+        # Playwright al abrir la primera página, Telegram al primer envío y
+        # Pillow solo si hay cámaras en la ejecución.
+        from http_pool import HttpPool
+        from telegram_delivery import TelegramDelivery
+
+        self.browser_pool = BrowserPool(
+            self.browserless_url, max_pages=self.BROWSER_MAX_PAGES
+        )
+        self.http_pool = HttpPool(max_per_host=self.HTTP_MAX_PER_HOST)
+        self.frame_cache = FrameCache(os.path.join(self.CACHE_FOLDER, "frames"))
+        self.observations = ObservationStore(
+            os.path.join(self.CACHE_FOLDER, "metar.json")
+        )
+        self.scheduler = SourceScheduler(
+            {"http": self.HTTP_MAX_SOURCES, "browser": self.BROWSER_MAX_PAGES},
+            max_per_host=self.SOURCE_MAX_PER_HOST,
+        )
+        self.source_health = SourceHealth(
+            os.path.join(self.CACHE_FOLDER, "health.json"),
+            failure_threshold=self.CIRCUIT_FAILURE_THRESHOLD,
+            base_backoff=self.CIRCUIT_BACKOFF,
+        )
+        if self.IMAGE_POSTPROCESS and self._selected_cameras():
+            import image_processing
+
+            if image_processing.available():
+                # "spawn": un fork con hilos activos (httpx, to_thread) puede
+                # heredar locks tomados y dejar a los workers bloqueados
+                self.image_executor = ProcessPoolExecutor(
+                    max_workers=self.IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                # Arranca los workers ya, mientras las capturas esperan la red
+                for _ in range(self.IMAGE_WORKERS):
+                    self.image_executor.submit(image_processing.available)
+            else:
+                logging.warning("Pillow no está instalado: se omite el post-procesado.")
+        self.delivery = TelegramDelivery(
+            self._create_bot,
+            self.chat_ids,
+            flush_interval=self.MEDIA_FLUSH_SECONDS,
+            rate=self.TELEGRAM_RATE,
+            burst=self.TELEGRAM_BURST,
+            global_rate=self.TELEGRAM_GLOBAL_RATE,
+        ).start()
+
+    async def _stop_resources(self):
+        await self.delivery.close()
+        await self.browser_pool.close()
+        await self.http_pool.close()
+        if self.image_executor is not None:
+            self.image_executor.shutdown()
+            self.image_executor = None
+        self.frame_cache.save()
+        self.source_health.save()
+        self.observations.save()
 
     async def run(self):
         start_time = time.time()
         logging.info("================ INICIANDO EJECUCIÓN DEL BOT ================")
+        # Los archivos de salida se sobrescriben por nombre y los temporales del
+        # satélite se borran tras enviarse: basta con asegurar las carpetas
         for folder in [self.WEBCAM_OUTPUT_FOLDER, self.SATELLITE_OUTPUT_FOLDER]:
-            if os.path.exists(folder):
-                shutil.rmtree(folder)
-            os.makedirs(folder)
-
-        bot = telegram.Bot(token=self.telegram_token)
-
-        metar_task = asyncio.to_thread(self.get_metar_reports)
-        webcam_task = self.get_all_webcam_images()
+            os.makedirs(folder, exist_ok=True)
 
-        metar_report, image_data = await asyncio.gather(metar_task, webcam_task)
+        self._start_resources()
+        metrics = RunMetrics()
+        metrics.activate()
 
-        await self.send_report_to_telegram(bot, metar_report, image_data)
-        await self.generate_and_send_satellite_videos(bot)
+        try:
+            # Cada resultado sale hacia Telegram apenas está listo; el satélite
+            # corre en paralelo con las cámaras en lugar de esperar al final.
+            stages = []
+            if "metar" in self.stages:
+                stages.append(self._job_metar())
+            cameras = self._selected_cameras()
+            if cameras:
+                stages.append(
+                    self.get_all_webcam_images(
+                        cameras, on_image=self.delivery.add_photo
+                    )
+                )
+            if "satellite" in self.stages:
+                stages.append(self.generate_and_send_satellite_videos())
+            await asyncio.gather(*stages)
+            await self.delivery.flush()
+        finally:
+            await self._stop_resources()
+            metrics.finish()
+            metrics.write_reports(self.METRICS_FOLDER, keep=self.METRICS_KEEP)
 
         end_time = time.time()
         logging.info(f"🎉 PROCESO COMPLETADO en {end_time - start_time:.2f} segundos.")
         logging.info("================ EJECUCIÓN FINALIZADA ================")
 
+    # --- MODO DAEMON: cada fuente con su propio intervalo y recursos calientes ---
+    def _daemon_jobs(self):
+        jobs = []
+        if "metar" in self.stages:
+            jobs.append(("metar", self.METAR_INTERVAL, self._job_metar))
+        intervals = {
+            "image": self.STATIC_CAM_INTERVAL,
+            "interactive_simple": self.INTERACTIVE_CAM_INTERVAL,
+            "interactive": self.INTERACTIVE_CAM_INTERVAL,
+        }
+        for cam_type, interval in intervals.items():
+            cameras = [c for c in self._selected_cameras() if c["type"] == cam_type]
+            if cameras:
+                jobs.append(
+                    (
+                        f"webcams_{cam_type}",
+                        interval,
+                        lambda cameras=cameras: self._job_webcams(cameras),
+                    )
+                )
+        if "satellite" in self.stages:
+            jobs.append(("satellite", self.SATELLITE_INTERVAL, self._job_satellite))
+        return jobs
+
+    async def _job_metar(self):
+        report, on_sent = await self.get_metar_reports()
+        if report:
+            self.delivery.send_text(report, on_sent=on_sent)
+
+    async def _job_webcams(self, cameras):
+        await self.get_all_webcam_images(cameras, on_image=self.delivery.add_photo)
+        await self.delivery.flush()
+
+    async def _job_satellite(self):
+        await self.generate_and_send_satellite_videos()
+
+    async def _run_job(self, name, job, lock):
+        async with lock:
+            metrics = RunMetrics(run_name=name)
+            metrics.activate()
+            logging.info(f"⏱️ Iniciando tarea '{name}'.")
+            try:
+                await job()
+                await self.delivery.flush()
+            except Exception as e:
+                logging.error(f"Error en la tarea '{name}': {e}", exc_info=True)
+            finally:
+                metrics.finish()
+                metrics.write_reports(self.METRICS_FOLDER, keep=self.METRICS_KEEP)
+                self.frame_cache.save()
+                self.source_health.save()
+                self.observations.save()
+                logging.info(f"Tarea '{name}' terminada en {metrics.duration:.2f}s.")
+
+    async def _schedule(self, name, interval, job, running):
+        lock = asyncio.Lock()
+        # Arranque escalonado para que las tareas no coincidan todas a la vez
+        next_run = time.monotonic() + random.uniform(0, interval * self.SCHEDULE_JITTER)
+        while True:
+            await asyncio.sleep(max(0.0, next_run - time.monotonic()))
+            jitter = random.uniform(-1, 1) * interval * self.SCHEDULE_JITTER
+            next_run += interval + jitter
+            if lock.locked():
+                logging.warning(f"Tarea '{name}' aún en curso; se omite este turno.")
+                continue
+            task = asyncio.create_task(self._run_job(name, job, lock))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def run_daemon(self):
+        logging.info("================ INICIANDO BOT EN MODO DAEMON ================")
+        for folder in [self.WEBCAM_OUTPUT_FOLDER, self.SATELLITE_OUTPUT_FOLDER]:
+            os.makedirs(folder, exist_ok=True)
+        self._start_resources()
+        await self.delivery.bot.initialize()
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        running = set()
+        schedulers = [
+            asyncio.create_task(self._schedule(name, interval, job, running))
+            for name, interval, job in self._daemon_jobs()
+        ]
+        try:
+            await stop.wait()
+            logging.info("Señal de parada recibida; cerrando el daemon.")
+        finally:
+            for task in schedulers + list(running):
+                task.cancel()
+            await asyncio.gather(*schedulers, *running, return_exceptions=True)
+            await self._stop_resources()
+            await self.bot.shutdown()
+        logging.info("================ DAEMON FINALIZADO ================")
+
 
 if __name__ == "__main__":
-    controller = BotController()
-    asyncio.run(controller.run())
+    parser = argparse.ArgumentParser(description="Bot de webcams, METAR y satélite.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="mantenerse en ejecución y refrescar cada fuente según su intervalo",
+    )
+    parser.add_argument(
+        "--only",
+        help=f"etapas a ejecutar, separadas por coma ({','.join(STAGES)})",
+    )
+    args = parser.parse_args()
+
+    stages = None
+    if args.only:
+        stages = [stage.strip() for stage in args.only.split(",") if stage.strip()]
+        unknown = sorted(set(stages) - set(STAGES))
+        if unknown or not stages:
+            parser.error(f"etapas desconocidas: {', '.join(unknown) or args.only}")
+
+    controller = BotController(stages)
+    asyncio.run(controller.run_daemon() if args.daemon else controller.run())
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+
+from json_store import load_json, save_json
+
+WIND_PATTERN = re.compile(r"\b(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)\b")
+VARIABLE_WIND_PATTERN = re.compile(r"\b(\d{3})V(\d{3})\b")
+VISIBILITY_METERS_PATTERN = re.compile(r"\s(\d{4})(?:NDV)?\s")
+VISIBILITY_MILES_PATTERN = re.compile(r"\s(P|M)?(?:(\d+)\s)?(\d+)(?:/(\d+))?SM\b")
+# Capas convectivas (BKN020CB, OVC015TCU) y tipo de nube no observado (///)
+CEILING_PATTERN = re.compile(r"\b(BKN|OVC|VV)(\d{3})(?:CB|TCU|///)?(?!\S)")
+TEMPERATURE_PATTERN = re.compile(r"\s(M?\d{2})/(M?\d{2})?\s")
+PRESSURE_PATTERN = re.compile(r"\b(Q|A)(\d{4})\b")
+# Desde aquí lo que sigue es pronóstico de tendencia u observaciones
+# adicionales; sus capas no son el techo observado
+TREND_PATTERN = re.compile(r"\s(?:RMK|TEMPO|BECMG|NOSIG)(?!\S)")
+
+METERS_PER_MILE = 1609.34
+CATEGORY_ICONS = {"VFR": "🟢", "MVFR": "🔵", "IFR": "🔴", "LIFR": "🟣"}
+
+
+def _temperature(value):
+    if value is None:
+        return None
+    return -int(value[1:]) if value.startswith("M") else int(value)
+
+
+def flight_category(visibility_m, ceiling_ft):
+    # Criterios de la FAA: manda el peor entre techo y visibilidad
+    miles = None if visibility_m is None else visibility_m / METERS_PER_MILE
+    ceiling = ceiling_ft if ceiling_ft is not None else float("inf")
+    if ceiling < 500 or (miles is not None and miles < 1):
+        return "LIFR"
+    if ceiling < 1000 or (miles is not None and miles < 3):
+        return "IFR"
+    if ceiling <= 3000 or (miles is not None and miles <= 5):
+        return "MVFR"
+    return "VFR"
+
+
+def decode_metar(raw):
+    # Registro compacto a partir del texto crudo; los campos que no aparecen
+    # quedan en None (p. ej. estaciones sin nubes reportadas no tienen techo).
+    body = f" {TREND_PATTERN.split(raw, maxsplit=1)[0]} "
+    record = {
+        "wind_dir": None,
+        "wind_speed": None,
+        "wind_gust": None,
+        "visibility_m": None,
+        "ceiling_ft": None,
+        "temperature": None,
+        "dewpoint": None,
+        "pressure": None,
+    }
+
+    wind = WIND_PATTERN.search(body)
+    if wind:
+        factor = 1.94384 if wind.group(4) == "MPS" else 1
+        record["wind_dir"] = wind.group(1)
+        record["wind_speed"] = round(int(wind.group(2)) * factor)
+        if wind.group(3):
+            record["wind_gust"] = round(int(wind.group(3)) * factor)
+        variable = VARIABLE_WIND_PATTERN.search(body)
+        if variable:
+            record["wind_variable"] = f"{variable.group(1)}V{variable.group(2)}"
+
+    if " CAVOK " in body:
+        record["visibility_m"] = 10000
+    else:
+        miles = VISIBILITY_MILES_PATTERN.search(body)
+        meters = VISIBILITY_METERS_PATTERN.search(body)
+        if miles:
+            value = int(miles.group(3)) / int(miles.group(4) or 1)
+            value += int(miles.group(2) or 0)
+            record["visibility_m"] = round(value * METERS_PER_MILE)
+        elif meters:
+            record["visibility_m"] = int(meters.group(1))
+
+    ceilings = [int(height) * 100 for _, height in CEILING_PATTERN.findall(body)]
+    if ceilings:
+        record["ceiling_ft"] = min(ceilings)
+
+    temperature = TEMPERATURE_PATTERN.search(body)
+    if temperature:
+        record["temperature"] = _temperature(temperature.group(1))
+        record["dewpoint"] = _temperature(temperature.group(2))
+
+    pressure = PRESSURE_PATTERN.search(body)
+    if pressure:
+        value = int(pressure.group(2))
+        record["pressure"] = f"Q{value}" if pressure.group(1) == "Q" else f"A{value}"
+
+    record["category"] = flight_category(record["visibility_m"], record["ceiling_ft"])
+    return record
+
+
+def _format_visibility(meters):
+    if meters is None:
+        return "—"
+    if meters >= 9999:
+        return "10 km+"
+    if meters >= 5000:
+        return f"{meters / 1000:.0f} km"
+    return f"{meters} m"
+
+
+def format_station(name, icao, record, raw, taf=None):
+    wind = "—"
+    if record["wind_speed"] == 0:
+        wind = "calma"
+    elif record["wind_speed"] is not None:
+        direction = "VRB" if record["wind_dir"] == "VRB" else f"{record['wind_dir']}°"
+        wind = f"{direction} {record['wind_speed']} kt"
+        if record["wind_gust"]:
+            wind += f" G{record['wind_gust']}"
+        if record.get("wind_variable"):
+            wind += f" ({record['wind_variable']})"
+    ceiling = f"{record['ceiling_ft']} ft" if record["ceiling_ft"] is not None else "—"
+    details = [
+        f"Viento {wind}",
+        f"Vis {_format_visibility(record['visibility_m'])}",
+        f"Techo {ceiling}",
+    ]
+    if record["temperature"] is not None:
+        dewpoint = record["dewpoint"] if record["dewpoint"] is not None else "—"
+        details.append(f"{record['temperature']}/{dewpoint} °C")
+    if record["pressure"]:
+        details.append(record["pressure"])
+
+    category = record["category"]
+    text = (
+        f"*{icao} ({name})* {CATEGORY_ICONS.get(category, '')} {category}\n"
+        f"{' · '.join(details)}\n`{raw}`\n"
+    )
+    if taf:
+        text += f"TAF: `{taf}`\n"
+    return text + "\n"
+
+
+class ObservationStore:
+    # Último METAR/TAF enviado por estación, persistido entre ejecuciones: solo
+    # se decodifica y se reporta lo que cambió.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.entries = load_json(path, "Almacén de observaciones")
+
+    def due(self, icao, refresh):
+        # Un METAR rutinario sale cada 30-60 min: mientras el último sea más
+        # reciente que "refresh" no se vuelve a pedir esa estación.
+        observed_at = (self.entries.get(icao) or {}).get("observed_at")
+        return not observed_at or time.time() - observed_at >= refresh
+
+    def is_new(self, icao, kind, raw):
+        return (self.entries.get(icao) or {}).get(kind) != raw
+
+    def update(self, icao, kind, raw, observed_at=None):
+        # Se registra cuando el reporte ya se envió; devuelve True si el texto
+        # crudo era nuevo para esa estación
+        entry = self.entries.setdefault(icao, {})
+        if entry.get(kind) == raw:
+            return False
+        entry[kind] = raw
+        if kind == "metar":
+            entry["observed_at"] = observed_at or time.time()
+        return True
+
+    def save(self):
+        save_json(self.path, self.entries)
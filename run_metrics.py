@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+
+# Ejecución activa en el contexto actual; las tareas asyncio la heredan, así
+# cada etapa registra sus spans sin tener que pasar el objeto a mano.
+_current_run = contextvars.ContextVar("current_run", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.outcome = "ok"
+        self.error = None
+
+    def as_dict(self):
+        data = {
+            "name": self.name,
+            **self.attributes,
+            "started_at": round(self.started_at, 3),
+            "duration": round(self.duration, 4),
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "outcome": self.outcome,
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class RunMetrics:
+    def __init__(self, run_name="run"):
+        self.run_name = run_name
+        self.run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+
+    def activate(self):
+        return _current_run.set(self)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        current = Span(name, attributes)
+        token = _current_span.set(current)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.outcome = "error" if isinstance(e, Exception) else "cancelled"
+            current.error = repr(e)
+            raise
+        finally:
+            current.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self.spans.append(current)
+
+    def finish(self):
+        self.duration = time.time() - self.started_at
+
+    def summary(self):
+        stages = {}
+        for item in self.spans:
+            key = item.name
+            if "type" in item.attributes:
+                key = f"{item.name}:{item.attributes['type']}"
+            stages.setdefault(key, []).append(item)
+        return {
+            key: {
+                "count": len(items),
+                "errors": sum(1 for i in items if i.outcome in ("error", "cancelled")),
+                "total": round(sum(i.duration for i in items), 4),
+                "p50": round(percentile([i.duration for i in items], 0.5), 4),
+                "p95": round(percentile([i.duration for i in items], 0.95), 4),
+                "bytes": sum(i.bytes for i in items),
+                "retries": sum(i.retries for i in items),
+            }
+            for key, items in sorted(stages.items())
+        }
+
+    def as_dict(self):
+        return {
+            "run": self.run_name,
+            "run_id": self.run_id,
+            "started_at": round(self.started_at, 3),
+            "duration": round(self.duration or 0.0, 4),
+            "stages": self.summary(),
+            "spans": [item.as_dict() for item in self.spans],
+        }
+
+    def _prometheus_lines(self):
+        # Una serie por combinación de etiquetas: spans con las mismas etiquetas
+        # (p. ej. varias navegaciones) se acumulan en lugar de duplicarse.
+        series = {}
+        for item in self.spans:
+            pairs = {"stage": item.name, **item.attributes, "outcome": item.outcome}
+            labels = ",".join(
+                f'{key}="{_escape_label(value)}"' for key, value in pairs.items()
+            )
+            totals = series.setdefault(labels, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += item.duration
+            totals[2] += item.bytes
+            totals[3] += item.retries
+
+        run_label = f'run="{self.run_name}"'
+        lines = [
+            "# HELP bot_run_duration_seconds Duración total de la última ejecución.",
+            "# TYPE bot_run_duration_seconds gauge",
+            f"bot_run_duration_seconds{{{run_label}}} {self.duration or 0.0:.4f}",
+            "# HELP bot_run_timestamp_seconds Inicio de la última ejecución.",
+            "# TYPE bot_run_timestamp_seconds gauge",
+            f"bot_run_timestamp_seconds{{{run_label}}} {self.started_at:.0f}",
+        ]
+        for index, (metric, help_text) in enumerate(
+            (
+                ("bot_stage_count", "Spans registrados por etapa."),
+                ("bot_stage_duration_seconds", "Tiempo acumulado por etapa."),
+                ("bot_stage_bytes", "Bytes transferidos por etapa."),
+                ("bot_stage_retries", "Reintentos por etapa."),
+            )
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, totals in series.items():
+                value = totals[index]
+                value = f"{value:.4f}" if isinstance(value, float) else value
+                lines.append(f"{metric}{{{run_label},{labels}}} {value}")
+        return lines
+
+    def write_reports(self, folder, keep=None):
+        os.makedirs(folder, exist_ok=True)
+        json_path = os.path.join(folder, f"{self.run_name}_{self.run_id}.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, ensure_ascii=False, indent=2)
+        if keep:
+            # En modo daemon se conservan solo los últimos reportes por tarea.
+            # Se exige el formato del run_id tras el nombre: un glob con "*"
+            # tomaría también los de otra tarea con el mismo prefijo
+            # ("webcams_interactive" y "webcams_interactive_simple").
+            pattern = re.compile(rf"{re.escape(self.run_name)}_\d{{8}}T\d{{6}}Z\.json")
+            previous = sorted(
+                name for name in os.listdir(folder) if pattern.fullmatch(name)
+            )
+            for old_name in previous[:-keep]:
+                os.remove(os.path.join(folder, old_name))
+
+        # Escritura atómica para el textfile collector de node_exporter
+        prom_path = os.path.join(folder, f"bot_{self.run_name}.prom")
+        with open(f"{prom_path}.tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(self._prometheus_lines()) + "\n")
+        os.replace(f"{prom_path}.tmp", prom_path)
+        logging.info(f"Métricas de la ejecución guardadas en {json_path}.")
+        return json_path
+
+
+@contextmanager
+def _detached_span(name, attributes):
+    yield Span(name, attributes)
+
+
+def span(name, **attributes):
+    run = _current_run.get()
+    if run is None:
+        return _detached_span(name, attributes)
+    return run.span(name, **attributes)
+
+
+# Atajos para anotar el span más interno activo desde código que atrapa sus
+# propias excepciones (las capturas devuelven None en lugar de propagar).
+def add_bytes(count):
+    current = _current_span.get()
+    if current is not None:
+        current.bytes += count
+
+
+def add_retry():
+    current = _current_span.get()
+    if current is not None:
+        current.retries += 1
+
+
+def set_outcome(outcome, error=None):
+    current = _current_span.get()
+    if current is not None:
+        current.outcome = outcome
+        if error is not None:
+            current.error = repr(error)
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def using_run(run):
+    # Para trabajo diferido (p. ej. la cola de Telegram): registra los spans en
+    # la ejecución que originó el trabajo y no en la del worker.
+    token = _current_run.set(run)
+    try:
+        yield
+    finally:
+        _current_run.reset(token)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+
+
+class SatelliteFrameStore:
+    # Almacén en disco de los últimos frames de un mapa satelital. Los archivos
+    # se nombran por su marca de tiempo, así el orden alfabético es el temporal.
+    def __init__(self, folder, max_frames=24):
+        self.folder = folder
+        self.max_frames = max_frames
+        os.makedirs(folder, exist_ok=True)
+
+    def _frame_files(self):
+        return sorted(
+            name
+            for name in os.listdir(self.folder)
+            if re.fullmatch(r"\d+\.(?:gif|jpg|png)", name)
+        )
+
+    def latest(self):
+        files = self._frame_files()
+        return os.path.splitext(files[-1])[0] if files else ""
+
+    def add(self, timestamp, extension, content):
+        path = os.path.join(self.folder, f"{timestamp}{extension}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        files = self._frame_files()
+        for name in files[: max(0, len(files) - self.max_frames)]:
+            os.remove(os.path.join(self.folder, name))
+
+    def frames(self):
+        return [os.path.join(self.folder, name) for name in self._frame_files()]
+
+    def write_concat_list(self, frame_duration):
+        # Lista para el demuxer concat de ffmpeg; el último frame se repite
+        # porque ffmpeg ignora la duración de la última entrada.
+        frames = self.frames()
+        list_path = os.path.join(self.folder, "frames.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for frame in frames:
+                f.write(f"file '{os.path.abspath(frame)}'\nduration {frame_duration}\n")
+            if frames:
+                f.write(f"file '{os.path.abspath(frames[-1])}'\n")
+        return list_path
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+
+from json_store import load_json, save_json
+from run_metrics import percentile
+
+
+class SourceHealth:
+    # Historial persistente por fuente: últimas latencias exitosas, racha de
+    # fallos y estado del circuito. El timeout de cada fuente sale de su p95 y
+    # las que fallan seguido se omiten, probándolas de nuevo con backoff.
+    def __init__(
+        self,
+        path,
+        window=50,
+        min_samples=5,
+        failure_threshold=3,
+        base_backoff=900,
+        max_backoff=24 * 3600,
+    ):
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.entries = load_json(path, "Historial de fuentes")
+
+    def _entry(self, key):
+        return self.entries.setdefault(
+            key,
+            {
+                "latencies": [],
+                "failure_streak": 0,
+                "successes": 0,
+                "failures": 0,
+                "open_until": 0,
+            },
+        )
+
+    def timeout(self, key, default, margin=1.5, minimum=5):
+        # Sin historial suficiente se usa el límite fijo; con historial, el p95
+        # por el margen, acotado entre el mínimo y ese mismo límite fijo.
+        latencies = self._entry(key)["latencies"]
+        if len(latencies) < self.min_samples:
+            return default
+        return min(default, max(minimum, percentile(latencies, 0.95) * margin))
+
+    def expected_latency(self, key, default):
+        latencies = self._entry(key)["latencies"]
+        if len(latencies) < self.min_samples:
+            return default
+        return percentile(latencies, 0.5)
+
+    def allow(self, key):
+        # Circuito cerrado, o abierto pero ya vencido (se deja pasar un intento)
+        return time.time() >= self._entry(key)["open_until"]
+
+    def retry_in(self, key):
+        return max(0.0, self._entry(key)["open_until"] - time.time())
+
+    def record_success(self, key, duration):
+        entry = self._entry(key)
+        if entry["failure_streak"] >= self.failure_threshold:
+            logging.info(f"Fuente '{key}' respondió de nuevo; se cierra el circuito.")
+        entry["latencies"] = (entry["latencies"] + [round(duration, 3)])[-self.window :]
+        entry["failure_streak"] = 0
+        entry["successes"] += 1
+        entry["open_until"] = 0
+        entry["last_success"] = time.time()
+
+    def record_failure(self, key):
+        entry = self._entry(key)
+        entry["failure_streak"] += 1
+        entry["failures"] += 1
+        entry["last_failure"] = time.time()
+        excess = entry["failure_streak"] - self.failure_threshold
+        if excess >= 0:
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** min(excess, 16))
+            entry["open_until"] = time.time() + backoff
+            logging.warning(
+                f"Fuente '{key}' con {entry['failure_streak']} fallos seguidos; "
+                f"circuito abierto por {backoff / 60:.0f} min."
+            )
+
+    def save(self):
+        save_json(self.path, self.entries)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class SourceScheduler:
+    # Límites de fuentes en curso a la vez: por backend ("http" o "browser")
+    # y por host de origen, para no apilar sesiones sobre un mismo servidor.
+    # Primero se toma el cupo del host y después el del backend, así una
+    # fuente que espera a su host no retiene un cupo que otro host podría usar.
+    def __init__(self, backend_limits, max_per_host=4):
+        self.max_per_host = max_per_host
+        self._backends = {
+            backend: asyncio.Semaphore(limit)
+            for backend, limit in backend_limits.items()
+        }
+        self._hosts = {}
+
+    @staticmethod
+    def order(items, expected_latency):
+        # Las más lentas primero (LPT): el tiempo total queda acotado por la
+        # fuente más lenta y no por una lenta que arrancó al final de la cola.
+        # Los semáforos atienden en orden FIFO, así que el orden se respeta.
+        return sorted(items, key=expected_latency, reverse=True)
+
+    @asynccontextmanager
+    async def slot(self, backend, host):
+        host_semaphore = self._hosts.get(host)
+        if host_semaphore is None:
+            host_semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        async with host_semaphore, self._backends[backend]:
+            yield
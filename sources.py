@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+from urllib.parse import urlsplit
+
+CAMERA_TYPES = {"image", "interactive_simple", "interactive"}
+# Campos obligatorios además de name/page_url según el tipo de cámara
+CAMERA_FIELDS = {
+    "image": ("base_url", "image_id"),
+    "interactive_simple": ("image_id",),
+    "interactive": (),
+}
+ICAO_PATTERN = re.compile(r"^[A-Z0-9]{4}$")
+
+
+def _is_url(value):
+    if not isinstance(value, str):
+        return False
+    parts = urlsplit(value)
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+def _validate_cameras(cameras, errors):
+    if not isinstance(cameras, list):
+        errors.append("'cameras' debe ser una lista.")
+        return
+    names = set()
+    for index, camera in enumerate(cameras):
+        where = f"cameras[{index}]"
+        if not isinstance(camera, dict):
+            errors.append(f"{where}: debe ser un objeto.")
+            continue
+        name = camera.get("name")
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"{where}: falta 'name'.")
+        elif name in names:
+            errors.append(f"{where}: nombre duplicado '{name}'.")
+        else:
+            names.add(name)
+            where = f"cámara '{name}'"
+        cam_type = camera.setdefault("type", "image")
+        if cam_type not in CAMERA_TYPES:
+            errors.append(f"{where}: tipo desconocido '{cam_type}'.")
+            continue
+        if not _is_url(camera.get("page_url")):
+            errors.append(f"{where}: 'page_url' no es una URL http(s).")
+        for field in CAMERA_FIELDS[cam_type]:
+            if not camera.get(field):
+                errors.append(f"{where}: falta '{field}' (requerido para {cam_type}).")
+        if "base_url" in camera and not _is_url(camera["base_url"]):
+            errors.append(f"{where}: 'base_url' no es una URL http(s).")
+
+
+def _validate_metar(metar, errors):
+    stations = metar.get("stations") if isinstance(metar, dict) else None
+    if not isinstance(stations, list) or not stations:
+        errors.append("'metar.stations' debe ser una lista no vacía.")
+        return
+    for index, station in enumerate(stations):
+        if not isinstance(station, dict) or not ICAO_PATTERN.match(
+            str(station.get("icao", ""))
+        ):
+            errors.append(f"metar.stations[{index}]: código OACI inválido.")
+            continue
+        station.setdefault("name", station["icao"])
+
+
+def _validate_satellite(satellite, errors, incremental):
+    if not isinstance(satellite, dict):
+        errors.append("'satellite' debe ser un objeto.")
+        return
+    if not _is_url(satellite.get("start_url")):
+        errors.append("satellite: 'start_url' no es una URL http(s).")
+    # La lista de frames solo se usa en modo incremental
+    frames_url = satellite.get("frames_url")
+    if incremental and (
+        not _is_url(frames_url)
+        or not all(field in frames_url for field in ("{map_id}", "{count}"))
+    ):
+        errors.append("satellite: 'frames_url' debe incluir {map_id} y {count}.")
+    maps = satellite.get("maps")
+    if not isinstance(maps, list):
+        errors.append("satellite: 'maps' debe ser una lista.")
+        return
+    for index, mapa in enumerate(maps):
+        if not isinstance(mapa, dict) or not mapa.get("id") or not mapa.get("caption"):
+            errors.append(f"satellite.maps[{index}]: requiere 'id' y 'caption'.")
+
+
+def load_sources(path, incremental_satellite=True):
+    # Lee y valida el registro de fuentes; reporta todos los errores juntos
+    # para poder corregir el archivo de una sola vez.
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: se esperaba un objeto JSON.")
+
+    errors = []
+    _validate_cameras(data.get("cameras", []), errors)
+    _validate_metar(data.get("metar"), errors)
+    _validate_satellite(data.get("satellite"), errors, incremental_satellite)
+    if errors:
+        raise ValueError(f"{path} inválido:\n  - " + "\n  - ".join(errors))
+    data.setdefault("cameras", [])
+    return data
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+import time
+
+import run_metrics
+
+# Límite de caracteres de un mensaje de texto en Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_text(text, limit=MAX_MESSAGE_LENGTH):
+    # Corta en los límites entre bloques (línea en blanco) para no partir el
+    # Markdown de una estación a la mitad; un bloque más largo que el límite
+    # se corta a la fuerza.
+    chunks, current = [], ""
+    for block in text.split("\n\n"):
+        candidate = f"{current}\n\n{block}" if current else block
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        while len(block) > limit:
+            chunks.append(block[:limit])
+            block = block[limit:]
+        current = block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def pause(self, seconds):
+        # Telegram pidió esperar (retry_after): nadie envía hasta entonces
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self, tokens=1):
+        # Un envío puede costar varios mensajes (un media group cuenta cada
+        # foto). Si cuesta más que la capacidad, sale con la cubeta llena y
+        # queda en deuda: los envíos siguientes esperan a que se recupere.
+        needed = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= needed:
+                self._tokens -= tokens
+                return
+            await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+class TelegramDelivery:
+    # Cola de salida hacia Telegram: el texto se envía apenas llega, las fotos
+    # se agrupan en media groups (por tamaño o por tiempo) y los videos se
+    # envían en orden. Cada chat tiene su propio limitador de tasa y todos
+    # comparten además uno global (el bot entero no puede pasar de ~30 msg/s).
+    # Con varios destinos, cada archivo se sube una sola vez (al primer chat que
+    # lo acepte) y al resto se reenvía por file_id en paralelo, sin volver a
+    # subir bytes: el ancho de banda de salida no crece con el número de chats.
+    # Textos y fotos aceptan un on_sent que se llama cuando al menos un chat
+    # los recibió; ahí quien los generó marca su estado como entregado.
+    def __init__(
+        self,
+        bot_factory,
+        chat_ids,
+        batch_size=10,
+        flush_interval=5.0,
+        rate=1.0,
+        burst=3,
+        global_rate=30.0,
+        max_retries=3,
+    ):
+        # El bot (y con él python-telegram-bot) se crea recién al primer envío
+        self._bot_factory = bot_factory
+        self._bot = None
+        self.chat_ids = list(chat_ids)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # Telegram limita los mensajes por chat, así que cada destino lleva su cubeta
+        self.buckets = {chat_id: TokenBucket(rate, burst) for chat_id in self.chat_ids}
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._queue = asyncio.Queue()
+        self._pending = []
+        self._flush_deadline = 0.0
+        self._worker = None
+
+    @property
+    def bot(self):
+        if self._bot is None:
+            self._bot = self._bot_factory()
+        return self._bot
+
+    def start(self):
+        self._worker = asyncio.create_task(self._run())
+        return self
+
+    def _put(self, kind, payload, future=None):
+        self._queue.put_nowait((kind, payload, run_metrics.current_run(), future))
+
+    def send_text(self, text, on_sent=None):
+        self._put("text", (text, on_sent))
+
+    def add_photo(self, path, caption, on_sent=None):
+        self._put("photo", (path, caption, on_sent))
+
+    async def send_video(self, path, caption):
+        future = asyncio.get_running_loop().create_future()
+        self._put("video", (path, caption), future)
+        return await future
+
+    async def flush(self):
+        future = asyncio.get_running_loop().create_future()
+        self._put("flush", None, future)
+        await future
+
+    async def close(self):
+        await self.flush()
+        self._queue.put_nowait(None)
+        await self._worker
+
+    async def _run(self):
+        while True:
+            timeout = None
+            if self._pending:
+                timeout = max(0.0, self._flush_deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush_photos()
+                continue
+            if item is None:
+                await self._flush_photos()
+                return
+
+            kind, payload, run, future = item
+            result = None
+            try:
+                with run_metrics.using_run(run):
+                    if kind == "text":
+                        await self._send_text(*payload)
+                    elif kind == "photo":
+                        if not self._pending:
+                            self._flush_deadline = (
+                                time.monotonic() + self.flush_interval
+                            )
+                        path, caption, on_sent = payload
+                        self._pending.append((path, caption, run, on_sent))
+                        if len(self._pending) >= self.batch_size:
+                            await self._flush_photos()
+                    elif kind == "video":
+                        result = await self._send_video(*payload)
+                    elif kind == "flush":
+                        await self._flush_photos()
+            except Exception as e:
+                logging.error(f"Error en la cola de Telegram: {e}", exc_info=True)
+                result = False
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _notify(on_sent):
+        if on_sent is None:
+            return
+        try:
+            on_sent()
+        except Exception as e:
+            logging.error(f"Error al registrar un envío completado: {e}", exc_info=True)
+
+    async def _call(self, method, chat_id, **kwargs):
+        from telegram.error import RetryAfter
+
+        bucket = self.buckets[chat_id]
+        # Telegram cuenta cada foto de un media group como un mensaje
+        cost = len(kwargs["media"]) if "media" in kwargs else 1
+        for attempt in range(self.max_retries + 1):
+            # Primero el cupo del chat y después el global, para no acaparar
+            # tokens globales mientras se espera el propio chat
+            await bucket.acquire(cost)
+            await self.global_bucket.acquire(cost)
+            try:
+                return await method(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                delay = e.retry_after
+                if hasattr(delay, "total_seconds"):
+                    delay = delay.total_seconds()
+                if attempt == self.max_retries:
+                    raise
+                run_metrics.add_retry()
+                logging.warning(
+                    f"Telegram pide esperar {delay}s antes de reintentar ({chat_id})."
+                )
+                bucket.pause(delay)
+
+    async def _fan_out(self, description, upload, resend):
+        # Sube al primer chat que lo acepte y reenvía al resto por file_id.
+        # upload(chat_id) devuelve los file_ids (o None si Telegram no los dio,
+        # en cuyo caso el siguiente chat vuelve a subir el archivo).
+        remaining = list(self.chat_ids)
+        file_ids = None
+        sent = 0
+        while remaining and file_ids is None:
+            chat_id = remaining.pop(0)
+            try:
+                file_ids = await upload(chat_id)
+                sent += 1
+                logging.info(f"{description} enviado a {chat_id}.")
+            except Exception as e:
+                logging.error(
+                    f"Error al enviar {description} a Telegram ({chat_id}): {e}",
+                    exc_info=True,
+                )
+
+        async def resend_to(chat_id):
+            try:
+                await resend(chat_id, file_ids)
+                logging.info(f"{description} reenviado a {chat_id} (file_id).")
+                return True
+            except Exception as e:
+                logging.error(
+                    f"Error al reenviar {description} a Telegram ({chat_id}): {e}",
+                    exc_info=True,
+                )
+                return False
+
+        if remaining:
+            results = await asyncio.gather(*(resend_to(c) for c in remaining))
+            sent += sum(results)
+        return sent > 0
+
+    async def _send_text(self, text, on_sent=None):
+        async def send_to(chat_id):
+            try:
+                for chunk in split_text(text):
+                    with run_metrics.span("telegram_send", method="send_message"):
+                        await self._call(
+                            self.bot.send_message,
+                            chat_id,
+                            text=chunk,
+                            parse_mode="Markdown",
+                        )
+                logging.info(f"Mensaje de texto (METAR) enviado a {chat_id}.")
+                return True
+            except Exception as e:
+                logging.error(
+                    f"Error al enviar reporte a Telegram ({chat_id}): {e}",
+                    exc_info=True,
+                )
+                return False
+
+        results = await asyncio.gather(*(send_to(c) for c in self.chat_ids))
+        if any(results):
+            self._notify(on_sent)
+
+    async def _flush_photos(self):
+        pending, self._pending = self._pending, []
+        valid = [
+            item
+            for item in pending
+            if os.path.exists(item[0]) and os.path.getsize(item[0]) > 0
+        ]
+        for i in range(0, len(valid), self.batch_size):
+            await self._send_media_group(valid[i : i + self.batch_size])
+
+    async def _send_media_group(self, batch):
+        captions = [caption for _, caption, _, _ in batch]
+        with run_metrics.using_run(batch[0][2]):
+            sent = await self._fan_out(
+                f"grupo de {len(batch)} imágenes",
+                lambda chat_id: self._upload_media_group(chat_id, batch),
+                lambda chat_id, file_ids: self._resend_media_group(
+                    chat_id, file_ids, captions
+                ),
+            )
+        if sent:
+            for _, _, _, on_sent in batch:
+                self._notify(on_sent)
+
+    async def _upload_media_group(self, chat_id, batch):
+        import telegram
+
+        with run_metrics.span(
+            "telegram_send", method="send_media_group", mode="upload"
+        ) as span:
+            media = []
+            for path, caption, _, _ in batch:
+                span.bytes += os.path.getsize(path)
+                # InputMediaPhoto lee el archivo al construirse; se cierra enseguida
+                with open(path, "rb") as photo:
+                    media.append(telegram.InputMediaPhoto(photo, caption=caption))
+            messages = await self._call(
+                self.bot.send_media_group,
+                chat_id,
+                media=media,
+                read_timeout=60,
+                write_timeout=60,
+            )
+        # Se usa la versión más grande de cada foto; si falta alguna, no se reutiliza
+        file_ids = [message.photo[-1].file_id for message in messages if message.photo]
+        return file_ids if len(file_ids) == len(batch) else None
+
+    async def _resend_media_group(self, chat_id, file_ids, captions):
+        import telegram
+
+        with run_metrics.span(
+            "telegram_send", method="send_media_group", mode="file_id"
+        ):
+            await self._call(
+                self.bot.send_media_group,
+                chat_id,
+                media=[
+                    telegram.InputMediaPhoto(file_id, caption=caption)
+                    for file_id, caption in zip(file_ids, captions)
+                ],
+            )
+
+    async def _send_video(self, video_path, caption):
+        logging.info(f"Enviando video '{os.path.basename(video_path)}' a Telegram.")
+        return await self._fan_out(
+            f"video '{os.path.basename(video_path)}'",
+            lambda chat_id: self._upload_video(chat_id, video_path, caption),
+            lambda chat_id, file_id: self._resend_video(chat_id, file_id, caption),
+        )
+
+    async def _upload_video(self, chat_id, video_path, caption):
+        import telegram
+
+        with run_metrics.span(
+            "telegram_send", method="send_video", mode="upload"
+        ) as span:
+            span.bytes = os.path.getsize(video_path)
+            # Se lee una sola vez para poder reintentar tras un retry_after
+            with open(video_path, "rb") as video_file:
+                video = telegram.InputFile(
+                    video_file, filename=os.path.basename(video_path)
+                )
+            message = await self._call(
+                self.bot.send_video,
+                chat_id,
+                video=video,
+                caption=caption,
+                supports_streaming=True,
+                read_timeout=60,
+                write_timeout=60,
+            )
+        return message.video.file_id if message.video else None
+
+    async def _resend_video(self, chat_id, file_id, caption):
+        with run_metrics.span("telegram_send", method="send_video", mode="file_id"):
+            await self._call(
+                self.bot.send_video,
+                chat_id,
+                video=file_id,
+                caption=caption,
+                supports_streaming=True,
+            )
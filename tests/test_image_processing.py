@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+from image_processing import process_image
+
+
+def night_webcam(path):
+    # Cielo oscuro uniforme arriba y escena con detalle abajo
+    image = Image.new("RGB", (640, 360), (4, 6, 12))
+    draw = ImageDraw.Draw(image)
+    for x in range(0, 640, 16):
+        draw.rectangle((x, 200, x + 8, 360), fill=(200, 180, 90))
+    image.save(path, "JPEG", quality=90)
+
+
+def letterboxed(path):
+    image = Image.new("RGB", (640, 360), (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for x in range(80, 560, 16):
+        draw.rectangle((x, 40, x + 8, 320), fill=(200, 180, 90))
+    image.save(path, "PNG")
+
+
+def run(path, folder, crop_border=False):
+    return process_image(path, str(folder), 1280, "jpeg", 82, 4, crop_border)
+
+
+def test_camera_bytes_are_not_cropped(tmp_path):
+    path = str(tmp_path / "volcan.jpg")
+    night_webcam(path)
+    with open(path, "rb") as f:
+        original = f.read()
+
+    info = run(path, tmp_path)
+
+    assert info["status"] == "ok"
+    assert tuple(info["size"]) == (640, 360)
+    # La captura original queda intacta para la caché de frames
+    with open(path, "rb") as f:
+        assert f.read() == original
+
+
+def test_screenshot_letterbox_is_cropped(tmp_path):
+    path = str(tmp_path / "crater.png")
+    letterboxed(path)
+
+    info = run(path, tmp_path, crop_border=True)
+
+    assert info["status"] == "ok"
+    assert info["path"] != path
+    assert os.path.exists(path)
+    width, height = info["size"]
+    assert width < 500 and height < 300
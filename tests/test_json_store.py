@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from json_store import load_json, save_json
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "estado.json")
+    assert load_json(path, "Estado") == {}
+    save_json(path, {"MROC": {"metar": "MROC 171200Z 09012KT CAVOK 25/18 Q1013"}})
+    assert load_json(path, "Estado")["MROC"]["metar"].startswith("MROC")
+    assert not (tmp_path / "estado.json.tmp").exists()
+
+
+def test_corrupt_file_starts_empty(tmp_path, caplog):
+    path = tmp_path / "estado.json"
+    path.write_text('{"MROC": ', encoding="utf-8")
+    assert load_json(str(path), "Estado") == {}
+    assert "Estado ilegible" in caplog.text
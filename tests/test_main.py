@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from main import BotController
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+GIF = b"GIF89a\x01\x00\x01\x00"
+WEBP = b"RIFF\x24\x00\x00\x00WEBPVP8 "
+HTML = b"<!DOCTYPE html><html><body>Mantenimiento</body></html>"
+
+
+def response(status, content, content_type=None):
+    headers = {"Content-Type": content_type} if content_type is not None else {}
+    return SimpleNamespace(status_code=status, content=content, headers=headers)
+
+
+@pytest.mark.parametrize(
+    "status, content, content_type, expected",
+    [
+        (304, b"", None, True),
+        (200, JPEG, "image/jpeg", True),
+        (200, PNG, "Image/PNG", True),
+        (200, HTML, "text/html; charset=utf-8", False),
+        (200, JPEG, "application/json", False),
+        (200, JPEG, "application/octet-stream", False),
+        (200, b"", "image/jpeg", False),
+        (404, JPEG, "image/jpeg", False),
+        (200, JPEG, None, True),
+        (200, PNG, None, True),
+        (200, GIF, None, True),
+        (200, WEBP, None, True),
+        (200, HTML, None, False),
+        (200, JPEG, "", True),
+    ],
+)
+def test_is_image_response(status, content, content_type, expected):
+    assert (
+        BotController._is_image_response(response(status, content, content_type))
+        is expected
+    )
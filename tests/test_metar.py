@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from metar import ObservationStore, decode_metar, flight_category
+
+METAR_CASES = [
+    # (METAR, viento, visibilidad m, techo ft, temp, rocío, categoría)
+    (
+        "MROC 171200Z 09012G22KT 060V120 9999 FEW030 BKN080 25/18 Q1013 NOSIG",
+        ("090", 12, 22),
+        9999,
+        8000,
+        25,
+        18,
+        "VFR",
+    ),
+    (
+        "MROC 171800Z 09012KT 9999 BKN020CB 25/18 Q1013",
+        ("090", 12, None),
+        9999,
+        2000,
+        25,
+        18,
+        "MVFR",
+    ),
+    (
+        "MRLB 171800Z 08015G25KT 9999 FEW012TCU BKN015TCU 31/22 Q1010",
+        ("080", 15, 25),
+        9999,
+        1500,
+        31,
+        22,
+        "MVFR",
+    ),
+    (
+        "MRLM 171800Z 36004KT 4000 TSRA OVC008CB 24/23 Q1011",
+        ("360", 4, None),
+        4000,
+        800,
+        24,
+        23,
+        "IFR",
+    ),
+    (
+        "MROC 171200Z 09012KT 9999 FEW030 25/18 Q1013 TEMPO BKN008",
+        ("090", 12, None),
+        9999,
+        None,
+        25,
+        18,
+        "VFR",
+    ),
+    (
+        "MRLB 171800Z 08010KT 9999 SCT025 BKN040 31/22 Q1010 BECMG 4000 RA BKN012",
+        ("080", 10, None),
+        9999,
+        4000,
+        31,
+        22,
+        "VFR",
+    ),
+    (
+        "MRLM 171800Z 36004KT 6000 BKN015 24/23 Q1011 TEMPO 2000 TSRA OVC006CB",
+        ("360", 4, None),
+        6000,
+        1500,
+        24,
+        23,
+        "MVFR",
+    ),
+    (
+        "MRPV 171200Z 27006KT 9999 BKN025/// 22/16 Q1014",
+        ("270", 6, None),
+        9999,
+        2500,
+        22,
+        16,
+        "MVFR",
+    ),
+    (
+        "MRLB 171200Z 00000KT CAVOK 30/20 Q1011",
+        ("000", 0, None),
+        10000,
+        None,
+        30,
+        20,
+        "VFR",
+    ),
+    (
+        "KJFK 171151Z 18005KT 1 1/2SM BR OVC004 12/11 A2992 RMK AO2 SLP132",
+        ("180", 5, None),
+        2414,
+        400,
+        12,
+        11,
+        "LIFR",
+    ),
+    (
+        "KDEN 171153Z 36008KT 2 1/2SM -SN BKN012 OVC020 M03/M05 A3001",
+        ("360", 8, None),
+        4023,
+        1200,
+        -3,
+        -5,
+        "IFR",
+    ),
+    (
+        "KBOS 171154Z 00000KT 1/4SM FG VV001 M01/M01 A3012",
+        ("000", 0, None),
+        402,
+        100,
+        -1,
+        -1,
+        "LIFR",
+    ),
+    (
+        "MRPV 171200Z VRB03KT 3000 -RA VV008 M02/M05 Q1015",
+        ("VRB", 3, None),
+        3000,
+        800,
+        -2,
+        -5,
+        "IFR",
+    ),
+    (
+        "KLAX 171153Z 27010KT P6SM SCT250 20/M01 A3001",
+        ("270", 10, None),
+        9656,
+        None,
+        20,
+        -1,
+        "VFR",
+    ),
+    (
+        "UUEE 171200Z 27005MPS 9999 SCT030 M05/M10 Q1020",
+        ("270", 10, None),
+        9999,
+        None,
+        -5,
+        -10,
+        "VFR",
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "raw, wind, visibility, ceiling, temperature, dewpoint, category", METAR_CASES
+)
+def test_decode_metar(raw, wind, visibility, ceiling, temperature, dewpoint, category):
+    record = decode_metar(raw)
+    assert (record["wind_dir"], record["wind_speed"], record["wind_gust"]) == wind
+    assert record["visibility_m"] == visibility
+    assert record["ceiling_ft"] == ceiling
+    assert record["temperature"] == temperature
+    assert record["dewpoint"] == dewpoint
+    assert record["category"] == category
+
+
+def test_decode_metar_pressure_and_variable_wind():
+    record = decode_metar(METAR_CASES[0][0])
+    assert record["pressure"] == "Q1013"
+    assert record["wind_variable"] == "060V120"
+    assert (
+        decode_metar("KJFK 171151Z 18005KT 10SM CLR 12/04 A2992")["pressure"] == "A2992"
+    )
+
+
+@pytest.mark.parametrize(
+    "visibility, ceiling, category",
+    [
+        (None, None, "VFR"),
+        (9999, 3100, "VFR"),
+        (9999, 3000, "MVFR"),
+        (8000, None, "MVFR"),
+        (4900, None, "MVFR"),
+        (4828, None, "IFR"),
+        (9999, 999, "IFR"),
+        (9999, 500, "IFR"),
+        (3000, None, "IFR"),
+        (9999, 499, "LIFR"),
+        (1500, None, "LIFR"),
+        (300, 2000, "LIFR"),
+    ],
+)
+def test_flight_category(visibility, ceiling, category):
+    assert flight_category(visibility, ceiling) == category
+
+
+def test_observation_store_records_only_on_update(tmp_path):
+    path = str(tmp_path / "observations.json")
+    raw = METAR_CASES[0][0]
+    store = ObservationStore(path)
+    assert store.is_new("MROC", "metar", raw)
+    assert store.due("MROC", refresh=1800)
+
+    # Sin update (envío fallido) el reporte sigue pendiente tras reiniciar
+    store.save()
+    store = ObservationStore(path)
+    assert store.is_new("MROC", "metar", raw)
+
+    assert store.update("MROC", "metar", raw)
+    store.save()
+    store = ObservationStore(path)
+    assert not store.is_new("MROC", "metar", raw)
+    assert not store.due("MROC", refresh=1800)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from run_metrics import RunMetrics
+
+
+def write(folder, run_name, run_id):
+    metrics = RunMetrics(run_name=run_name)
+    metrics.run_id = run_id
+    metrics.finish()
+    return metrics.write_reports(str(folder), keep=3)
+
+
+def test_keep_prunes_only_its_own_job(tmp_path):
+    for hour in range(5):
+        write(tmp_path, "webcams_interactive_simple", f"20261017T{hour:02d}0000Z")
+    for hour in range(5):
+        latest = write(tmp_path, "webcams_interactive", f"20261017T{hour:02d}3000Z")
+
+    reports = sorted(p.name for p in tmp_path.glob("*.json"))
+    assert reports == [
+        "webcams_interactive_20261017T023000Z.json",
+        "webcams_interactive_20261017T033000Z.json",
+        "webcams_interactive_20261017T043000Z.json",
+        "webcams_interactive_simple_20261017T020000Z.json",
+        "webcams_interactive_simple_20261017T030000Z.json",
+        "webcams_interactive_simple_20261017T040000Z.json",
+    ]
+    assert latest.endswith("webcams_interactive_20261017T043000Z.json")
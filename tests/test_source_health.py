@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import source_health
+from source_health import SourceHealth
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(source_health.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def health(tmp_path, clock):
+    return SourceHealth(
+        str(tmp_path / "health.json"),
+        window=10,
+        min_samples=5,
+        failure_threshold=3,
+        base_backoff=900,
+        max_backoff=3600,
+    )
+
+
+def test_circuit_opens_at_threshold(health):
+    health.record_failure("cam")
+    health.record_failure("cam")
+    assert health.allow("cam")
+    # excess 0: el tercer fallo abre el circuito por el backoff base
+    health.record_failure("cam")
+    assert not health.allow("cam")
+    assert health.retry_in("cam") == 900
+
+
+@pytest.mark.parametrize(
+    "failures, backoff",
+    [(3, 900), (4, 1800), (5, 3600), (6, 3600), (40, 3600)],
+)
+def test_backoff_doubles_up_to_cap(health, failures, backoff):
+    for _ in range(failures):
+        health.record_failure("cam")
+    assert health.retry_in("cam") == backoff
+
+
+def test_probe_after_open_until(health, clock):
+    for _ in range(3):
+        health.record_failure("cam")
+    clock.now += 899
+    assert not health.allow("cam")
+    clock.now += 1
+    assert health.allow("cam")
+
+    # La prueba falla: el circuito se reabre con el doble de espera
+    health.record_failure("cam")
+    assert not health.allow("cam")
+    assert health.retry_in("cam") == 1800
+
+    # La prueba responde: se cierra y se reinicia la racha
+    clock.now += 1800
+    health.record_success("cam", 2.0)
+    assert health.allow("cam")
+    assert health.retry_in("cam") == 0
+    health.record_failure("cam")
+    assert health.allow("cam")
+
+
+@pytest.mark.parametrize(
+    "latencies, expected",
+    [
+        ([], 60),
+        ([2.0] * 4, 60),  # menos de min_samples: límite fijo
+        ([2.0] * 5, 5),  # 2 * 1.5 = 3, acotado al mínimo
+        ([10.0] * 5, 15.0),  # p95 * margen
+        ([10.0] * 4 + [30.0], 45.0),
+        ([50.0] * 5, 60),  # nunca por encima del límite fijo
+    ],
+)
+def test_timeout_from_p95(health, latencies, expected):
+    for latency in latencies:
+        health.record_success("cam", latency)
+    assert health.timeout("cam", 60, margin=1.5, minimum=5) == expected
+
+
+def test_latency_window_and_persistence(health, tmp_path):
+    for latency in range(1, 16):
+        health.record_success("cam", float(latency))
+    for _ in range(3):
+        health.record_failure("other")
+    health.save()
+
+    reloaded = SourceHealth(str(tmp_path / "health.json"), window=10)
+    assert reloaded.entries["cam"]["latencies"] == [float(v) for v in range(6, 16)]
+    assert reloaded.expected_latency("cam", 99) == 10.0
+    assert not reloaded.allow("other")
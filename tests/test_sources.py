@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import os
+
+import pytest
+
+from sources import load_sources
+
+REGISTRY = {
+    "cameras": [
+        {
+            "name": "Cartago",
+            "page_url": "https://cartagoenvivo.com/",
+            "base_url": "https://cartagoenvivo.com/",
+            "image_id": "liveImage",
+            "type": "image",
+        },
+        {
+            "name": "Volcan Turrialba",
+            "page_url": "https://www.ovsicori.una.ac.cr/camara-v-turrialba",
+            "image_id": "camara",
+            "type": "interactive_simple",
+        },
+    ],
+    "metar": {"stations": [{"icao": "MROC", "name": "Juan Santamaría"}]},
+    "satellite": {
+        "start_url": "https://rammb.cira.colostate.edu/ramsdis/online/rmtc.asp",
+        "frames_url": "https://rammb.cira.colostate.edu/loop.asp?data_folder={map_id}&number_of_images_to_display={count}",
+        "maps": [{"id": "rmtc/rmtccosvis1", "caption": "Visible"}],
+    },
+}
+
+
+def write(tmp_path, data):
+    path = tmp_path / "sources.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def registry(change=None):
+    data = copy.deepcopy(REGISTRY)
+    if change:
+        change(data)
+    return data
+
+
+def test_valid_registry_gets_defaults(tmp_path):
+    def without_defaults(data):
+        del data["cameras"][0]["type"]
+        del data["metar"]["stations"][0]["name"]
+
+    sources = load_sources(write(tmp_path, registry(without_defaults)))
+    assert sources["cameras"][0]["type"] == "image"
+    assert sources["metar"]["stations"][0]["name"] == "MROC"
+
+
+def test_shipped_registry_is_valid():
+    path = os.path.join(os.path.dirname(__file__), "..", "sources.json")
+    assert load_sources(path)["cameras"]
+
+
+@pytest.mark.parametrize(
+    "change, message",
+    [
+        (
+            lambda data: data["cameras"][0].update(type="video"),
+            "tipo desconocido 'video'",
+        ),
+        (
+            lambda data: data["cameras"][0].pop("image_id"),
+            "falta 'image_id' (requerido para image)",
+        ),
+        (
+            lambda data: data["cameras"][1].pop("image_id"),
+            "falta 'image_id' (requerido para interactive_simple)",
+        ),
+        (
+            lambda data: data["cameras"][1].update(name="Cartago"),
+            "nombre duplicado 'Cartago'",
+        ),
+        (
+            lambda data: data["cameras"][0].update(page_url="cartagoenvivo.com"),
+            "'page_url' no es una URL http(s)",
+        ),
+        (
+            lambda data: data["metar"]["stations"].append({"icao": "mroc1"}),
+            "metar.stations[1]: código OACI inválido",
+        ),
+        (
+            lambda data: data["satellite"].update(
+                frames_url="https://rammb.cira.colostate.edu/loop.asp?n={count}"
+            ),
+            "'frames_url' debe incluir {map_id} y {count}",
+        ),
+        (
+            lambda data: data["satellite"].update(
+                frames_url="https://rammb.cira.colostate.edu/{map_id}"
+            ),
+            "'frames_url' debe incluir {map_id} y {count}",
+        ),
+        (
+            lambda data: data["satellite"]["maps"].append({"id": "rmtc/x"}),
+            "satellite.maps[1]: requiere 'id' y 'caption'",
+        ),
+    ],
+)
+def test_invalid_registry(tmp_path, change, message):
+    with pytest.raises(ValueError) as error:
+        load_sources(write(tmp_path, registry(change)))
+    assert message in str(error.value)
+
+
+def test_all_errors_reported_together(tmp_path):
+    def broken(data):
+        data["cameras"][0]["type"] = "video"
+        data["metar"]["stations"][0]["icao"] = "X"
+
+    with pytest.raises(ValueError) as error:
+        load_sources(write(tmp_path, registry(broken)))
+    assert "tipo desconocido" in str(error.value)
+    assert "código OACI inválido" in str(error.value)
+
+
+def test_frames_url_only_required_in_incremental_mode(tmp_path):
+    path = write(tmp_path, registry(lambda data: data["satellite"].pop("frames_url")))
+    with pytest.raises(ValueError, match="frames_url"):
+        load_sources(path)
+    assert load_sources(path, incremental_satellite=False)["satellite"]["maps"]
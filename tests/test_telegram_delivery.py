@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+
+from telegram_delivery import (
+    MAX_MESSAGE_LENGTH,
+    TelegramDelivery,
+    TokenBucket,
+    split_text,
+)
+
+
+def station_block(index):
+    return f"*X{index:03d} (Estación {index})* 🟢 VFR\n`X{index:03d} {'9999 ' * 20}`"
+
+
+@pytest.mark.parametrize(
+    "text, limit, expected",
+    [
+        ("corto", 10, ["corto"]),
+        ("uno\n\ndos\n\ntres", 8, ["uno\n\ndos", "tres"]),
+        ("uno\n\ndos", 100, ["uno\n\ndos"]),
+        ("a" * 25, 10, ["a" * 10, "a" * 10, "a" * 5]),
+        ("ab\n\n" + "c" * 12, 10, ["ab", "c" * 10, "cc"]),
+        ("", 10, []),
+    ],
+)
+def test_split_text(text, limit, expected):
+    assert split_text(text, limit) == expected
+
+
+def test_split_text_keeps_station_blocks_whole():
+    header = "*Reporte Meteorológico de Aeropuertos*\n" + "-" * 30
+    blocks = [header] + [station_block(i) for i in range(200)]
+    text = "\n\n".join(blocks)
+
+    chunks = split_text(text)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert "\n\n".join(chunks) == text
+    for chunk in chunks:
+        # Ningún bloque queda partido: cada trozo empieza en un bloque completo
+        assert chunk.split("\n\n")[0] in blocks
+
+
+def test_token_bucket_charges_every_token():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=3)
+        start = time.monotonic()
+        # Un media group de 10 fotos sale con la cubeta llena y deja deuda
+        await bucket.acquire(10)
+        first = time.monotonic() - start
+        await bucket.acquire()
+        return first, time.monotonic() - start
+
+    first, second = asyncio.run(scenario())
+    assert first < 0.02
+    # Deuda de 7 más el mensaje siguiente: 8 tokens a 100/s
+    assert second >= 0.075
+
+
+def test_global_bucket_limits_all_chats():
+    pytest.importorskip("telegram")
+
+    sent = []
+
+    async def send_message(chat_id, text):
+        sent.append((chat_id, time.monotonic()))
+
+    async def scenario():
+        # Cada chat admitiría su envío de inmediato; el cupo global no
+        delivery = TelegramDelivery(
+            lambda: None, range(30), rate=100, burst=5, global_rate=20
+        )
+        start = time.monotonic()
+        await asyncio.gather(
+            *(delivery._call(send_message, chat_id, text="x") for chat_id in range(30))
+        )
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(scenario())
+    assert len(sent) == 30
+    # 20 en ráfaga y 10 más a 20/s
+    assert elapsed >= 0.45
+
+
+@pytest.mark.parametrize("fails, expected", [(set(), 1), ({1}, 1), ({1, 2}, 0)])
+def test_on_sent_only_after_delivery(fails, expected):
+    pytest.importorskip("telegram")
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, parse_mode):
+            if chat_id in fails:
+                raise RuntimeError("sin conexión")
+
+    async def scenario():
+        delivered = []
+        delivery = TelegramDelivery(FakeBot, [1, 2]).start()
+        delivery.send_text("METAR", on_sent=lambda: delivered.append(True))
+        await delivery.close()
+        return len(delivered)
+
+    assert asyncio.run(scenario()) == expected